@@ -43,7 +43,7 @@ def test_stream_chat(token: str):
     }
     
     print(f"\n📤 发送请求...")
-    start_time = time.time()
+    start_time = time.perf_counter_ns()
     
     try:
         with httpx.stream(
@@ -59,11 +59,24 @@ def test_stream_chat(token: str):
                 print("\n📥 流式响应内容:")
                 print("-" * 70)
                 
-                for line in response.iter_lines():
-                    if line.strip():
-                        print(line)
+                # 直接按字节切分行并原样写出，不逐行解码成 str
+                sys.stdout.flush()
+                out = sys.stdout.buffer
+                buf = bytearray()
+                for chunk in response.iter_bytes(64 * 1024):  # 与 test_proxy 的 SSE_CHUNK_SIZE 一致
+                    buf += chunk
+                    while (nl := buf.find(b"\n")) != -1:
+                        line = bytes(buf[:nl])
+                        del buf[:nl + 1]
+                        if line.strip():
+                            out.write(line)
+                            out.write(b"\n")
+                if buf.strip():
+                    out.write(bytes(buf))
+                    out.write(b"\n")
+                out.flush()
                 
-                elapsed = time.time() - start_time
+                elapsed = (time.perf_counter_ns() - start_time) / 1e9
                 print("-" * 70)
                 print(f"\n✓ 完成，耗时: {elapsed:.2f}秒")
             else:
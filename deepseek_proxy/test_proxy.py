@@ -1,39 +1,275 @@
 #!/usr/bin/env python3
 """DeepSeek 代理服务测试脚本"""
 
-from time import sleep
+import asyncio
+import atexit
+import contextvars
+import functools
+import inspect
 import httpx
-import json
+import io
+import orjson
+import os
+import re
+import socket
 import sys
-from typing import Iterator
+import threading
+import time
+import traceback
+from typing import AsyncIterator, Iterator
+from urllib.parse import urlsplit
 
 # 代理服务配置
 PROXY_URL = "http://localhost:8877"
-LOGIN_ENDPOINT = f"{PROXY_URL}/auth/login"
-CHAT_ENDPOINT = f"{PROXY_URL}/chat/completions"
+# 共享客户端均以 PROXY_URL 为 base_url，接口使用相对路径
+LOGIN_PATH = "/auth/login"
+CHAT_PATH = "/chat/completions"
+ADMIN_PATH = "/admin"
 
 # 测试账号
 USERNAME = "admin"
 PASSWORD = "admin123"
 
+# 启动前额外做 HTTP 健康检查的路径 (为空时只探测 TCP 端口)
+HEALTH_PATH = os.getenv("TEST_HEALTH_PATH", "")
+
+# 失败时是否打印完整堆栈 (--verbose 或环境变量 TEST_VERBOSE=1)
+VERBOSE = "--verbose" in sys.argv or os.getenv("TEST_VERBOSE") == "1"
+
+# 是否启用 HTTP/2 (环境变量 TEST_HTTP2=1，需安装 httpx[http2])
+# 注意：代理为明文 http，httpx 不做 h2c 升级，本地测试时实际仍走 HTTP/1.1
+USE_HTTP2 = os.getenv("TEST_HTTP2") == "1"
+
+# 连接池上限：并发测试的所有流复用同一组 keep-alive 连接
+POOL_LIMITS = httpx.Limits(max_keepalive_connections=64, max_connections=128, keepalive_expiry=60.0)
+
+
+def http2_enabled(http2: bool) -> bool:
+    """请求 HTTP/2 但未安装 h2 时回退 HTTP/1.1"""
+    if not http2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def make_session(base_url: str = PROXY_URL) -> httpx.Client:
+    """创建同步客户端：关闭传输层重试，让失败直接暴露给测试"""
+    return httpx.Client(
+        base_url=base_url,
+        timeout=30.0,
+        transport=httpx.HTTPTransport(http2=http2_enabled(USE_HTTP2), retries=0, limits=POOL_LIMITS)
+    )
+
+
+# 共享连接池：所有测试复用 keep-alive 连接，避免每次请求重新建连
+SESSION = make_session()
+atexit.register(SESSION.close)
+
+# 所有异步测试共享的 AsyncClient，由 run_all 在事件循环内创建/关闭
+ASYNC_SESSION: httpx.AsyncClient | None = None
+
+
+def make_async_client(http2: bool = False) -> httpx.AsyncClient:
+    """创建并发测试用的 AsyncClient
+    
+    关闭传输层重试，让限流/失败直接暴露给测试；http2=True 需要安装 httpx[http2]，
+    未安装时回退 HTTP/1.1。
+    """
+    return httpx.AsyncClient(
+        base_url=PROXY_URL,
+        timeout=30.0,
+        transport=httpx.AsyncHTTPTransport(http2=http2_enabled(http2), retries=0, limits=POOL_LIMITS)
+    )
+
+
+# 请求体统一用 orjson 预先序列化，以 content= 发送
+JSON_HEADERS = {"Content-Type": "application/json"}
+CHAT_TEMPLATE = {"model": "deepseek-chat", "stream": True}
+
+
+def chat_body(messages: list[dict], **kwargs) -> bytes:
+    """序列化聊天请求体 (同一条消息在并发请求间只序列化一次)"""
+    return orjson.dumps({**CHAT_TEMPLATE, "messages": messages, **kwargs})
+
+
+def rjson(response: httpx.Response):
+    """用 orjson 直接解析响应字节 (服务端响应均为 UTF-8 JSON)"""
+    return orjson.loads(response.content)
+
+
+@functools.lru_cache(maxsize=64)
+def login_body(username: str, password: str) -> bytes:
+    """序列化登录请求体 (同一账号只序列化一次)"""
+    return orjson.dumps({"username": username, "password": password})
+
+
+def auth_headers(token: str) -> dict:
+    """构造带 Bearer Token 的请求头"""
+    return {"Authorization": f"Bearer {token}", **JSON_HEADERS}
+
+# 登录 Token 缓存: (username, password) -> (token, 过期时刻)
+TOKEN_REFRESH_MARGIN = 10  # 距离过期不足该秒数时重新登录
+_TOKEN_CACHE: dict[tuple[str, str], tuple[str, float]] = {}
+_TOKEN_LOCK = threading.Lock()
+
+
+def get_token(username: str = USERNAME, password: str = PASSWORD) -> str:
+    """获取登录 Token，有效期内复用缓存，避免每个测试重复登录"""
+    key = (username, password)
+    with _TOKEN_LOCK:
+        cached = _TOKEN_CACHE.get(key)
+        if cached and time.monotonic() < cached[1] - TOKEN_REFRESH_MARGIN:
+            return cached[0]
+        
+        response = SESSION.post(
+            LOGIN_PATH,
+            content=login_body(username, password),
+            headers=JSON_HEADERS,
+            timeout=5.0
+        )
+        response.raise_for_status()
+        return remember_token(username, password, rjson(response))
+
+
+async def get_token_async(username: str = USERNAME, password: str = PASSWORD) -> str:
+    """异步测试用的 get_token：放到线程中执行，持锁登录 (同步请求) 时不阻塞事件循环"""
+    return await asyncio.to_thread(get_token, username, password)
+
+
+def remember_token(username: str, password: str, data: dict) -> str:
+    """把登录接口返回的 Token 写入缓存，返回 Token"""
+    _TOKEN_CACHE[(username, password)] = (data["token"], time.monotonic() + data["expires_in"])
+    return data["token"]
+
+
+def invalidate_token(username: str):
+    """丢弃该用户的缓存 Token (用户被停用/删除后调用)"""
+    with _TOKEN_LOCK:
+        for key in [key for key in _TOKEN_CACHE if key[0] == username]:
+            del _TOKEN_CACHE[key]
+
+
+SSE_DONE = b"[DONE]"
+# 读取流式响应的块大小 (只用于流式对话，登录等普通请求不受影响)
+SSE_CHUNK_SIZE = 65536
+# 一次扫描匹配缓冲区内所有完整的 "data:" 行；捕获组已去掉负载首尾的空白与 \r
+# (冒号后的空格可省略或有多个)；event:/id:/注释行不匹配，直接跳过
+SSE_DATA_RE = re.compile(rb"^data:[ \t]*(.*?)[ \t\r]*$", re.MULTILINE)
+
+# 安装了 msgspec 时按固定结构解码 delta 帧，跳过中间 dict 的构造；否则用 orjson
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+if msgspec is not None:
+    class SSEDelta(msgspec.Struct):
+        content: str | None = None
+    
+    class SSEChoice(msgspec.Struct):
+        delta: SSEDelta = msgspec.field(default_factory=SSEDelta)
+    
+    class SSEChunk(msgspec.Struct):
+        choices: list[SSEChoice] = []
+    
+    _SSE_CHUNK_DECODER = msgspec.json.Decoder(SSEChunk)
+    SSE_DECODE_ERRORS = (msgspec.DecodeError,)
+    
+    def delta_content(payload) -> str | None:
+        """解析一帧 data 负载，返回其中的 delta.content"""
+        chunk = _SSE_CHUNK_DECODER.decode(payload)
+        return chunk.choices[0].delta.content if chunk.choices else None
+else:
+    SSE_DECODE_ERRORS = (orjson.JSONDecodeError,)
+    
+    def delta_content(payload) -> str | None:
+        """解析一帧 data 负载，返回其中的 delta.content"""
+        chunk = orjson.loads(payload)
+        choices = chunk.get("choices")
+        return (choices[0].get("delta") or {}).get("content") if choices else None
+
+
+class SSEDecoder:
+    """SSE 增量解码器：直接在字节上切分行，不做逐行 str 解码"""
+    
+    def __init__(self):
+        self._buffer = bytearray()
+        self.done = False
+    
+    def feed(self, data: bytes) -> list[str]:
+        """写入一段响应字节，返回其中完整 data 帧携带的文本片段
+        
+        用预编译正则一次扫描缓冲区中所有完整的 data 行，负载以 memoryview
+        切片直接交给解码器；已处理的字节在本次调用结束时一次性删除。
+        """
+        buffer = self._buffer
+        buffer += data
+        end = buffer.rfind(b"\n") + 1
+        contents = []
+        if not end:
+            return contents
+        
+        with memoryview(buffer) as view:
+            for match in SSE_DATA_RE.finditer(buffer, 0, end):
+                with view[match.start(1):match.end(1)] as payload:
+                    if payload[:len(SSE_DONE)] == SSE_DONE:
+                        self.done = True
+                        break
+                    # 只有完整的 JSON 对象才需要解码: 跳过空 data 行等保活帧，
+                    # 以及不以 } 结尾的残缺帧，免得解码失败再抛异常
+                    if payload[:1] != b"{" or payload[-1:] != b"}":
+                        continue
+                    
+                    try:
+                        content = delta_content(payload)
+                    except SSE_DECODE_ERRORS:
+                        continue
+                if content:
+                    contents.append(content)
+        del buffer[:end]
+        return contents
+
 
 class ProxyClient:
     """DeepSeek 代理客户端"""
     
-    def __init__(self, base_url: str = PROXY_URL):
-        self.base_url = base_url
-        self.client = httpx.Client(timeout=30.0)
-        self.token: str | None = None
+    def __init__(self, client: httpx.Client | None = None, base_url: str | None = None):
+        """默认复用模块级 SESSION；传入 client 时使用调用方的客户端；
+        指定其他 base_url 时单独创建客户端，并在 close() 时关闭"""
+        self._owns_client = client is None and base_url not in (None, PROXY_URL)
+        if client is not None:
+            self.client = client
+        elif self._owns_client:
+            self.client = make_session(base_url)
+        else:
+            self.client = SESSION
+        self._token: str | None = None
+        self._auth_headers: dict | None = None
+    
+    @property
+    def token(self) -> str | None:
+        return self._token
+    
+    @token.setter
+    def token(self, value: str | None):
+        """设置 Token 时同时生成认证请求头，chat() 直接复用"""
+        self._token = value
+        self._auth_headers = auth_headers(value) if value else None
     
     def login(self, username: str, password: str) -> dict:
         """登录获取 Token"""
         response = self.client.post(
-            f"{self.base_url}/auth/login",
-            json={"username": username, "password": password}
+            LOGIN_PATH,
+            content=login_body(username, password),
+            headers=JSON_HEADERS
         )
         response.raise_for_status()
-        data = response.json()
-        self.token = data["token"]
+        data = rjson(response)
+        with _TOKEN_LOCK:
+            self.token = remember_token(username, password, data)
         return data
     
     def chat(self, messages: list[dict], **kwargs) -> Iterator[str]:
@@ -41,40 +277,33 @@ class ProxyClient:
         if not self.token:
             raise ValueError("请先登录获取 Token")
         
-        request_data = {
-            "model": "deepseek-chat",
-            "messages": messages,
-            "stream": True,
-            **kwargs
-        }
-        
         with self.client.stream(
             "POST",
-            f"{self.base_url}/chat/completions",
-            json=request_data,
-            headers={"Authorization": f"Bearer {self.token}"},
+            CHAT_PATH,
+            content=chat_body(messages, **kwargs),
+            headers=self._auth_headers,
             timeout=30.0
         ) as response:
-            response.raise_for_status()
+            if response.status_code != 200:
+                response.read()  # 读出错误响应体，调用方可从异常中查看服务端错误信息
+                response.raise_for_status()
             
-            for line in response.iter_lines():
-                if line.startswith("data: "):
-                    data_str = line[6:]  # 去掉 "data: " 前缀
-                    if data_str.strip() == "[DONE]":
-                        break
-                    
-                    try:
-                        chunk = json.loads(data_str)
-                        if "choices" in chunk:
-                            delta = chunk["choices"][0].get("delta", {})
-                            if "content" in delta:
-                                yield delta["content"]
-                    except json.JSONDecodeError:
-                        continue
+            decoder = SSEDecoder()
+            # 代理不压缩 SSE 响应，直接读原始字节，跳过解码层；若带 Content-Encoding 则仍按解压后的字节读取
+            chunks = (
+                response.iter_bytes(SSE_CHUNK_SIZE) if response.headers.get("content-encoding")
+                else response.iter_raw(SSE_CHUNK_SIZE)
+            )
+            for data in chunks:
+                yield from decoder.feed(data)
+                if decoder.done:
+                    break
     
     def close(self):
-        """关闭客户端"""
-        self.client.close()
+        """关闭自己创建的客户端，可重复调用 (共享的 SESSION 在进程退出时统一关闭)"""
+        if self._owns_client:
+            self.client.close()
+            self._owns_client = False
     
     def __enter__(self):
         return self
@@ -83,454 +312,470 @@ class ProxyClient:
         self.close()
 
 
+async def stream_chat(client: httpx.AsyncClient, headers: dict, body: bytes) -> AsyncIterator[str]:
+    """异步流式对话 (并发测试共用同一个 AsyncClient 及预先构造的请求头/请求体)"""
+    async with client.stream(
+        "POST",
+        CHAT_PATH,
+        content=body,
+        headers=headers,
+        timeout=30.0
+    ) as response:
+        if response.status_code != 200:
+            await response.aread()  # 读出错误响应体，调用方可从异常中查看服务端错误信息
+            response.raise_for_status()
+        
+        decoder = SSEDecoder()
+        chunks = (
+            response.aiter_bytes(SSE_CHUNK_SIZE) if response.headers.get("content-encoding")
+            else response.aiter_raw(SSE_CHUNK_SIZE)
+        )
+        async for data in chunks:
+            for content in decoder.feed(data):
+                yield content
+            if decoder.done:
+                break
+
+
+def async_session() -> httpx.AsyncClient:
+    """返回共享的 AsyncClient (仅在 run_all 的事件循环内可用)"""
+    if ASYNC_SESSION is None:
+        raise RuntimeError("ASYNC_SESSION 尚未初始化，请通过 run_all 运行异步测试")
+    return ASYNC_SESSION
+
+
+async def send_chat_request(client: httpx.AsyncClient, idx: int, headers: dict, body: bytes, preview: int = 20):
+    """发送一次流式对话并计时 (各并发测试共用)
+    
+    返回 (序号, 结果, 耗时毫秒, 信息)，结果为 True / False / "blocked" (429 限流)
+    """
+    start = time.perf_counter_ns()
+    try:
+        response = "".join([c async for c in stream_chat(client, headers, body)])
+        elapsed_ms = (time.perf_counter_ns() - start) / 1e6
+        return idx, True, elapsed_ms, response[:preview]
+    except httpx.HTTPStatusError as e:
+        elapsed_ms = (time.perf_counter_ns() - start) / 1e6
+        if e.response.status_code == 429:
+            return idx, "blocked", elapsed_ms, "429 Too Many Requests"
+        return idx, False, elapsed_ms, str(e)
+    except httpx.HTTPError as e:
+        elapsed_ms = (time.perf_counter_ns() - start) / 1e6
+        return idx, False, elapsed_ms, str(e)
+
+
 def print_section(title: str):
     """打印分隔标题"""
-    print(f"\n{'='*60}")
-    print(f"  {title}")
-    print(f"{'='*60}\n")
+    sys.stdout.write(f"\n{'='*60}\n  {title}\n{'='*60}\n\n")
 
 
+def catching(message: str = "✗ 测试失败"):
+    """测试函数装饰器：未预期的异常统一打印为 "message: 异常" 并判定失败 (--verbose 时打印堆栈)"""
+    def report(e: Exception):
+        print(f"{message}: {e}")
+        if VERBOSE:
+            traceback.print_exc(file=sys.stdout)
+    
+    def decorate(test_func):
+        if inspect.iscoroutinefunction(test_func):
+            @functools.wraps(test_func)
+            async def wrapper(*args, **kwargs):
+                try:
+                    return await test_func(*args, **kwargs)
+                except Exception as e:
+                    report(e)
+                    return False
+        else:
+            @functools.wraps(test_func)
+            def wrapper(*args, **kwargs):
+                try:
+                    return test_func(*args, **kwargs)
+                except Exception as e:
+                    report(e)
+                    return False
+        return wrapper
+    return decorate
+
+
+@catching("✗ 登录失败")
 def test_login():
     """测试登录功能"""
     print_section("测试 1: 登录认证")
     
     with ProxyClient() as client:
-        try:
-            result = client.login(USERNAME, PASSWORD)
-            print(f"✓ 登录成功")
-            print(f"  Token: {result['token'][:20]}...")
-            print(f"  有效期: {result['expires_in']} 秒")
-            return True
-        except Exception as e:
-            print(f"✗ 登录失败: {e}")
-            return False
+        result = client.login(USERNAME, PASSWORD)
+        print(f"✓ 登录成功")
+        print(f"  Token: {result['token'][:20]}...")
+        print(f"  有效期: {result['expires_in']} 秒")
+        return True
 
 
+@catching("✗ 测试失败")
 def test_login_cache():
     """测试登录缓存：60秒内多次登录返回同一个token"""
     print_section("测试 2: 登录缓存 (60秒内同一token)")
     
-    try:
-        # 第一次登录
-        response1 = httpx.post(
-            LOGIN_ENDPOINT,
-            json={"username": USERNAME, "password": PASSWORD},
-            timeout=5.0
-        )
-        token1 = response1.json()["token"]
-        print(f"✓ 第1次登录 Token: {token1[:20]}...")
-        
-        # 第二次登录（立即）
-        response2 = httpx.post(
-            LOGIN_ENDPOINT,
-            json={"username": USERNAME, "password": PASSWORD},
-            timeout=5.0
-        )
-        token2 = response2.json()["token"]
-        print(f"✓ 第2次登录 Token: {token2[:20]}...")
-        
-        # 第三次登录（立即）
-        response3 = httpx.post(
-            LOGIN_ENDPOINT,
-            json={"username": USERNAME, "password": PASSWORD},
-            timeout=5.0
-        )
-        token3 = response3.json()["token"]
-        print(f"✓ 第3次登录 Token: {token3[:20]}...")
-        
-        # 验证是否相同
-        if token1 == token2 == token3:
-            print("\n✓ 验证成功：60秒内多次登录返回同一个 token")
-            return True
-        else:
-            print("\n✗ 验证失败：token 不同")
-            return False
-            
-    except Exception as e:
-        print(f"✗ 测试失败: {e}")
+    # 第一次登录
+    response1 = SESSION.post(
+        LOGIN_PATH,
+        content=login_body(USERNAME, PASSWORD),
+        headers=JSON_HEADERS,
+        timeout=5.0
+    )
+    token1 = rjson(response1)["token"]
+    print(f"✓ 第1次登录 Token: {token1[:20]}...")
+    
+    # 第二次登录（立即）
+    response2 = SESSION.post(
+        LOGIN_PATH,
+        content=login_body(USERNAME, PASSWORD),
+        headers=JSON_HEADERS,
+        timeout=5.0
+    )
+    token2 = rjson(response2)["token"]
+    print(f"✓ 第2次登录 Token: {token2[:20]}...")
+    
+    # 第三次登录（立即）
+    response3 = SESSION.post(
+        LOGIN_PATH,
+        content=login_body(USERNAME, PASSWORD),
+        headers=JSON_HEADERS,
+        timeout=5.0
+    )
+    token3 = rjson(response3)["token"]
+    print(f"✓ 第3次登录 Token: {token3[:20]}...")
+    
+    # 验证是否相同
+    if token1 == token2 == token3:
+        print("\n✓ 验证成功：60秒内多次登录返回同一个 token")
+        return True
+    else:
+        print("\n✗ 验证失败：token 不同")
         return False
 
 
+@catching("\n✗ 对话失败")
 def test_chat_stream():
     """测试流式对话"""
     print_section("测试 2: 流式对话")
     
     with ProxyClient() as client:
-        try:
-            # 登录
-            client.login(USERNAME, PASSWORD)
-            print("✓ 已获取 Token\n")
-            
-            # 发送消息
-            messages = [{"role": "user", "content": "用一句话介绍 DeepSeek"}]
-            print("📤 发送消息: 用一句话介绍 DeepSeek\n")
-            print("📥 流式响应:")
-            print("-" * 60)
-            
-            full_response = ""
-            for chunk in client.chat(messages):
-                print(chunk, end="", flush=True)
-                full_response += chunk
-            
-            print("\n" + "-" * 60)
-            print(f"\n✓ 接收完成 (共 {len(full_response)} 字符)")
-            return True
-            
-        except Exception as e:
-            print(f"\n✗ 对话失败: {e}")
-            import traceback
-            traceback.print_exc()
-            return False
+        client.token = get_token(USERNAME, PASSWORD)
+        print("✓ 已获取 Token\n")
+        
+        # 发送消息
+        messages = [{"role": "user", "content": "用一句话介绍 DeepSeek"}]
+        print("📤 发送消息: 用一句话介绍 DeepSeek\n")
+        print("📥 流式响应:")
+        print("-" * 60)
+        
+        parts: list[str] = []
+        for chunk in client.chat(messages):
+            print(chunk, end="", flush=True)
+            parts.append(chunk)
+        full_response = "".join(parts)
+        
+        print("\n" + "-" * 60)
+        print(f"\n✓ 接收完成 (共 {len(full_response)} 字符)")
+        return True
 
 
-def test_token_serial():
+@catching("✗ 测试失败")
+async def test_token_serial():
     """测试Token串行：同一token同时只允许1个请求"""
     print_section("测试 4: Token串行限流 (同一token同时只允1个)")
     
-    with ProxyClient() as client:
-        try:
-            client.login(USERNAME, PASSWORD)
-            print("✓ 已获取 Token\n")
-            
-            messages = [{"role": "user", "content": "说一个数字"}]
-            
-            print("发送 2 个并发请求 (使用同一个 token)...")
-            import time
-            from concurrent.futures import ThreadPoolExecutor, as_completed
-            
-            def send_request(idx: int):
-                start = time.time()
-                try:
-                    with ProxyClient() as c:
-                        c.token = client.token
-                        response = "".join(c.chat(messages))
-                        elapsed = time.time() - start
-                        return idx, True, elapsed, response[:20]
-                except httpx.HTTPStatusError as e:
-                    elapsed = time.time() - start
-                    if e.response.status_code == 429:
-                        return idx, "blocked", elapsed, "429 Too Many Requests"
-                    return idx, False, elapsed, str(e)
-                except Exception as e:
-                    elapsed = time.time() - start
-                    return idx, False, elapsed, str(e)
-            
-            with ThreadPoolExecutor(max_workers=2) as executor:
-                futures = [executor.submit(send_request, i) for i in range(2)]
-                
-                success_count = 0
-                blocked_count = 0
-                
-                for future in as_completed(futures):
-                    idx, success, elapsed, info = future.result()
-                    if success is True:
-                        print(f"✓ 请求 {idx+1}: {elapsed:.2f}秒 - 成功")
-                        success_count += 1
-                    elif success == "blocked":
-                        print(f"✓ 请求 {idx+1}: {elapsed:.2f}秒 - 被限流 (429)")
-                        blocked_count += 1
-                    else:
-                        print(f"✗ 请求 {idx+1}: {elapsed:.2f}秒 - {info}")
-            
-            # 应该有一个成功，一个被限流
-            if blocked_count > 0:
-                print(f"\n✓ 验证成功：同一token的并发请求被限流 ({blocked_count}个被阻止)")
-                return True
-            else:
-                print("\n⚠️  注意：没有请求被限流，可能是请求处理太快")
-                return True
-            
-        except Exception as e:
-            print(f"✗ 测试失败: {e}")
-            return False
+    token = await get_token_async(USERNAME, PASSWORD)
+    print("✓ 已获取 Token\n")
+    
+    body = chat_body([{"role": "user", "content": "说一个数字"}])
+    headers = auth_headers(token)
+    
+    print("发送 2 个并发请求 (使用同一个 token)...")
+    
+    success_count = 0
+    blocked_count = 0
+    
+    aclient = async_session()
+    results = await asyncio.gather(
+        send_chat_request(aclient, 0, headers, body),
+        send_chat_request(aclient, 1, headers, body),
+        return_exceptions=True
+    )
+    for i, result in enumerate(results):
+        if isinstance(result, Exception):
+            print(f"✗ 请求 {i+1}: {result}")
+            continue
+        idx, success, elapsed_ms, info = result
+        if success is True:
+            print(f"✓ 请求 {idx+1}: {elapsed_ms:.1f}ms - 成功")
+            success_count += 1
+        elif success == "blocked":
+            print(f"✓ 请求 {idx+1}: {elapsed_ms:.1f}ms - 被限流 (429)")
+            blocked_count += 1
+        else:
+            print(f"✗ 请求 {idx+1}: {elapsed_ms:.1f}ms - {info}")
+    
+    # 应该有一个成功，一个被限流
+    if blocked_count > 0:
+        print(f"\n✓ 验证成功：同一token的并发请求被限流 ({blocked_count}个被阻止)")
+        return True
+    else:
+        print("\n⚠️  注意：没有请求被限流，可能是请求处理太快")
+        return True
 
 
-def test_multi_user_concurrent():
+@catching("✗ 测试失败")
+async def test_multi_user_concurrent():
     """测试多用户并发：不同用户可以同时请求"""
     print_section("测试 5: 多用户并发 (不同 token 可并发)")
     
-    try:
-        # 用户1登录
-        response1 = httpx.post(
-            LOGIN_ENDPOINT,
-            json={"username": "admin", "password": "admin123"},
-            timeout=5.0
-        )
-        token1 = response1.json()["token"]
-        print("✓ 用户 admin 已登录")
-        
-        # 用户2登录
-        response2 = httpx.post(
-            LOGIN_ENDPOINT,
-            json={"username": "user1", "password": "pass123"},
-            timeout=5.0
-        )
-        token2 = response2.json()["token"]
-        print("✓ 用户 user1 已登录\n")
-        
-        messages = [{"role": "user", "content": "说一个数字"}]
-        
-        print("发送 2 个并发请求 (使用不同 token)...")
-        import time
-        from concurrent.futures import ThreadPoolExecutor, as_completed
-        
-        def send_request(idx: int, token: str):
-            start = time.time()
-            try:
-                with ProxyClient() as c:
-                    c.token = token
-                    response = "".join(c.chat(messages))
-                    elapsed = time.time() - start
-                    return idx, True, elapsed, response[:10]
-            except Exception as e:
-                elapsed = time.time() - start
-                return idx, False, elapsed, str(e)
-        
-        with ThreadPoolExecutor(max_workers=2) as executor:
-            futures = [
-                executor.submit(send_request, 0, token1),
-                executor.submit(send_request, 1, token2)
-            ]
-            
-            success_count = 0
-            for future in as_completed(futures):
-                idx, success, elapsed, info = future.result()
-                status = "✓" if success else "✗"
-                result = "成功" if success else info
-                print(f"{status} 用户 {idx+1}: {elapsed:.2f}秒 - {result}")
-                if success:
-                    success_count += 1
-        
-        if success_count == 2:
-            print("\n✓ 验证成功：不同token可以并发请求")
-            return True
-        else:
-            print(f"\n✗ 只有 {success_count}/2 成功")
-            return False
-            
-    except Exception as e:
-        print(f"✗ 测试失败: {e}")
-        import traceback
-        traceback.print_exc()
+    # 用户1登录
+    token1 = await get_token_async("admin", "admin123")
+    print("✓ 用户 admin 已登录")
+    
+    # 用户2登录
+    token2 = await get_token_async("user1", "pass123")
+    print("✓ 用户 user1 已登录\n")
+    
+    body = chat_body([{"role": "user", "content": "说一个数字"}])
+    
+    print("发送 2 个并发请求 (使用不同 token)...")
+    
+    success_count = 0
+    aclient = async_session()
+    results = await asyncio.gather(
+        send_chat_request(aclient, 0, auth_headers(token1), body, preview=10),
+        send_chat_request(aclient, 1, auth_headers(token2), body, preview=10),
+        return_exceptions=True
+    )
+    for i, result in enumerate(results):
+        if isinstance(result, Exception):
+            print(f"✗ 用户 {i+1}: {result}")
+            continue
+        idx, success, elapsed_ms, info = result
+        status = "✓" if success is True else "✗"
+        message = "成功" if success is True else info
+        print(f"{status} 用户 {idx+1}: {elapsed_ms:.1f}ms - {message}")
+        if success is True:
+            success_count += 1
+    
+    if success_count == 2:
+        print("\n✓ 验证成功：不同token可以并发请求")
+        return True
+    else:
+        print(f"\n✗ 只有 {success_count}/2 成功")
         return False
 
 
-def test_rate_limit():
+@catching("✗ 限流测试失败")
+async def test_rate_limit():
     """测试旧的限流功能（保留兼容）"""
     print_section("测试 6: 基础并发测试")
-    sleep(3)
+    # 无需等待: 按依赖关系，前序使用 admin 账号的测试都已读完各自的流式响应，服务端
+    # 按用户持有的串行许可随流结束释放；全局限流 (默认 20 req/s，突发 40) 也不会被这几个请求耗尽
     
-    with ProxyClient() as client:
-        try:
-            client.login(USERNAME, PASSWORD)
-            print("✓ 已获取 Token\n")
-            
-            messages = [{"role": "user", "content": "说一个数字"}]
-            
-            print("发送 3 个并发请求 (限流: 2 req/s)...")
-            import time
-            from concurrent.futures import ThreadPoolExecutor, as_completed
-            
-            def send_request(idx: int):
-                start = time.time()
-                try:
-                    with ProxyClient() as c:
-                        c.token = client.token
-                        response = "".join(c.chat(messages))
-                        elapsed = time.time() - start
-                        return idx, True, elapsed, response[:20]
-                except Exception as e:
-                    elapsed = time.time() - start
-                    return idx, False, elapsed, str(e)
-            
-            with ThreadPoolExecutor(max_workers=3) as executor:
-                futures = [executor.submit(send_request, i) for i in range(3)]
-                
-                for future in as_completed(futures):
-                    idx, success, elapsed, info = future.result()
-                    status = "✓" if success else "✗"
-                    print(f"{status} 请求 {idx+1}: {elapsed:.2f}秒 - {info}")
-            
-            print("\n✓ 限流测试完成")
-            return True
-            
-        except Exception as e:
-            print(f"✗ 限流测试失败: {e}")
-            return False
+    token = await get_token_async(USERNAME, PASSWORD)
+    print("✓ 已获取 Token\n")
+    
+    body = chat_body([{"role": "user", "content": "说一个数字"}])
+    headers = auth_headers(token)
+    
+    print("发送 3 个并发请求 (限流: 2 req/s)...")
+    
+    aclient = async_session()
+    results = await asyncio.gather(
+        *(send_chat_request(aclient, i, headers, body) for i in range(3)),
+        return_exceptions=True
+    )
+    for i, result in enumerate(results):
+        if isinstance(result, Exception):
+            print(f"✗ 请求 {i+1}: {result}")
+            continue
+        idx, success, elapsed_ms, info = result
+        status = "✓" if success is True else "✗"
+        print(f"{status} 请求 {idx+1}: {elapsed_ms:.1f}ms - {info}")
+    
+    print("\n✓ 限流测试完成")
+    return True
 
 
+@catching("✗ 测试失败")
 def test_unauthorized():
     """测试未授权访问"""
     print_section("测试 7: 未授权访问拦截")
 
-    try:
-        response = httpx.post(
-            CHAT_ENDPOINT,
-            json={"model": "deepseek-chat", "messages": [{"role": "user", "content": "test"}]},
-            timeout=5.0
-        )
-
-        if response.status_code == 401:
-            print("✓ 正确拦截未授权请求")
-            print(f"  状态码: {response.status_code}")
-            return True
-        else:
-            print(f"✗ 应该返回 401，实际返回: {response.status_code}")
-            return False
+    response = SESSION.post(
+        CHAT_PATH,
+        json={"model": "deepseek-chat", "messages": [{"role": "user", "content": "test"}]},
+        timeout=5.0
+    )
 
-    except Exception as e:
-        print(f"✗ 测试失败: {e}")
+    if response.status_code == 401:
+        print("✓ 正确拦截未授权请求")
+        print(f"  状态码: {response.status_code}")
+        return True
+    else:
+        print(f"✗ 应该返回 401，实际返回: {response.status_code}")
         return False
 
 
-def test_user_active_management():
-    """测试用户激活状态管理"""
+async def set_user_active(client: httpx.AsyncClient, username: str, is_active: bool) -> httpx.Response:
+    """管理接口：设置用户激活状态"""
+    return await client.post(
+        f"{ADMIN_PATH}/users/{username}/active",
+        json={"is_active": is_active},
+        timeout=5.0
+    )
+
+
+async def try_login(client: httpx.AsyncClient, username: str, password: str) -> httpx.Response:
+    """直接调用登录接口 (不经过 Token 缓存)，由调用方检查状态码"""
+    return await client.post(
+        LOGIN_PATH,
+        content=login_body(username, password),
+        headers=JSON_HEADERS,
+        timeout=5.0
+    )
+
+
+@catching("✗ 测试失败")
+async def test_user_active_management():
+    """测试用户激活状态管理
+    
+    每一步依赖上一步的用户状态，只有最后的登录验证与用户信息查询相互独立，合并为一轮并发请求。
+    """
     print_section("测试 8: 用户激活状态管理")
 
-    admin_api_base = f"{PROXY_URL}/admin"
+    client = async_session()
     test_username = "user2"
     test_password = "pass456"
 
-    try:
-        # 1. 先确保用户是激活状态
-        print("1. 设置用户为激活状态...")
-        response = httpx.post(
-            f"{admin_api_base}/users/{test_username}/active",
-            json={"is_active": True},
-            timeout=5.0
-        )
-        if response.status_code != 200:
-            print(f"✗ 设置激活状态失败: {response.status_code}")
-            return False
-        print(f"✓ 用户 {test_username} 已激活")
-
-        # 2. 测试激活用户可以登录
-        print(f"\n2. 测试激活用户登录...")
-        response = httpx.post(
-            LOGIN_ENDPOINT,
-            json={"username": test_username, "password": test_password},
-            timeout=5.0
-        )
-        if response.status_code == 200:
-            print(f"✓ 激活用户登录成功")
-        else:
-            print(f"✗ 激活用户登录失败: {response.status_code}")
-            return False
-
-        # 3. 停用用户
-        print(f"\n3. 停用用户 {test_username}...")
-        response = httpx.post(
-            f"{admin_api_base}/users/{test_username}/active",
-            json={"is_active": False},
-            timeout=5.0
-        )
-        if response.status_code != 200:
-            print(f"✗ 停用用户失败: {response.status_code}")
-            return False
-        result = response.json()
-        print(f"✓ {result['message']}")
-
-        # 4. 测试停用用户无法登录
-        print(f"\n4. 测试停用用户登录...")
-        response = httpx.post(
-            LOGIN_ENDPOINT,
-            json={"username": test_username, "password": test_password},
-            timeout=5.0
-        )
-        if response.status_code == 401:
-            error_msg = response.json()
-            print(f"✓ 停用用户被正确拒绝")
-            print(f"  错误信息: {error_msg}")
-        else:
-            print(f"✗ 停用用户不应该能登录，状态码: {response.status_code}")
-            return False
+    # 1. 先确保用户是激活状态
+    print("1. 设置用户为激活状态...")
+    response = await set_user_active(client, test_username, True)
+    if response.status_code != 200:
+        print(f"✗ 设置激活状态失败: {response.status_code}")
+        return False
+    print(f"✓ 用户 {test_username} 已激活")
 
-        # 5. 重新激活用户
-        print(f"\n5. 重新激活用户 {test_username}...")
-        response = httpx.post(
-            f"{admin_api_base}/users/{test_username}/active",
-            json={"is_active": True},
-            timeout=5.0
-        )
-        if response.status_code != 200:
-            print(f"✗ 重新激活失败: {response.status_code}")
-            return False
-        result = response.json()
-        print(f"✓ {result['message']}")
-
-        # 6. 验证重新激活后可以登录
-        print(f"\n6. 验证重新激活后可以登录...")
-        response = httpx.post(
-            LOGIN_ENDPOINT,
-            json={"username": test_username, "password": test_password},
-            timeout=5.0
-        )
-        if response.status_code == 200:
-            print(f"✓ 重新激活后登录成功")
-        else:
-            print(f"✗ 重新激活后登录失败: {response.status_code}")
-            return False
+    # 2. 测试激活用户可以登录
+    print(f"\n2. 测试激活用户登录...")
+    response = await try_login(client, test_username, test_password)
+    if response.status_code == 200:
+        print(f"✓ 激活用户登录成功")
+    else:
+        print(f"✗ 激活用户登录失败: {response.status_code}")
+        return False
 
-        # 7. 测试管理API只能从localhost访问（这个测试会失败，因为我们就是localhost）
-        print(f"\n7. 获取用户信息...")
-        response = httpx.get(
-            f"{admin_api_base}/users/{test_username}",
-            timeout=5.0
-        )
-        if response.status_code == 200:
-            user_info = response.json()
-            print(f"✓ 获取用户信息成功:")
-            print(f"  用户名: {user_info['username']}")
-            print(f"  配额档次: {user_info['quota_tier']}")
-            print(f"  激活状态: {user_info['is_active']}")
-        else:
-            print(f"✗ 获取用户信息失败: {response.status_code}")
-            return False
+    # 3. 停用用户
+    print(f"\n3. 停用用户 {test_username}...")
+    response = await set_user_active(client, test_username, False)
+    if response.status_code != 200:
+        print(f"✗ 停用用户失败: {response.status_code}")
+        return False
+    # 与 get_token 共用 _TOKEN_LOCK，其他线程持锁登录时会等待，同样放到线程中
+    await asyncio.to_thread(invalidate_token, test_username)
+    result = rjson(response)
+    print(f"✓ {result['message']}")
+
+    # 4. 测试停用用户无法登录
+    print(f"\n4. 测试停用用户登录...")
+    response = await try_login(client, test_username, test_password)
+    if response.status_code == 401:
+        error_msg = rjson(response)
+        print(f"✓ 停用用户被正确拒绝")
+        print(f"  错误信息: {error_msg}")
+    else:
+        print(f"✗ 停用用户不应该能登录，状态码: {response.status_code}")
+        return False
 
-        print("\n✓ 所有用户激活状态管理测试通过!")
-        return True
+    # 5. 重新激活用户
+    print(f"\n5. 重新激活用户 {test_username}...")
+    response = await set_user_active(client, test_username, True)
+    if response.status_code != 200:
+        print(f"✗ 重新激活失败: {response.status_code}")
+        return False
+    result = rjson(response)
+    print(f"✓ {result['message']}")
+
+    # 6/7. 重新激活后的登录验证与用户信息查询互不依赖，同一轮并发发出
+    login_response, info_response = await asyncio.gather(
+        try_login(client, test_username, test_password),
+        client.get(f"{ADMIN_PATH}/users/{test_username}", timeout=5.0)
+    )
+
+    print(f"\n6. 验证重新激活后可以登录...")
+    if login_response.status_code == 200:
+        print(f"✓ 重新激活后登录成功")
+    else:
+        print(f"✗ 重新激活后登录失败: {login_response.status_code}")
+        return False
 
-    except Exception as e:
-        print(f"✗ 测试失败: {e}")
-        import traceback
-        traceback.print_exc()
+    # 7. 测试管理API只能从localhost访问（这个测试会失败，因为我们就是localhost）
+    print(f"\n7. 获取用户信息...")
+    if info_response.status_code == 200:
+        user_info = rjson(info_response)
+        print(f"✓ 获取用户信息成功:")
+        print(f"  用户名: {user_info['username']}")
+        print(f"  配额档次: {user_info['quota_tier']}")
+        print(f"  激活状态: {user_info['is_active']}")
+    else:
+        print(f"✗ 获取用户信息失败: {info_response.status_code}")
         return False
 
+    print("\n✓ 所有用户激活状态管理测试通过!")
+    return True
+
 
+@catching("✗ 测试失败")
 def test_admin_list_users():
     """测试列出所有用户"""
     print_section("测试 9: 列出所有用户")
 
-    admin_api_base = f"{PROXY_URL}/admin"
-
-    try:
-        response = httpx.get(
-            f"{admin_api_base}/users",
-            timeout=5.0
-        )
+    admin_api_base = ADMIN_PATH
 
-        if response.status_code == 200:
-            result = response.json()
-            users = result['users']
-            print(f"✓ 成功获取用户列表 (共 {len(users)} 个用户):\n")
-            for user in users:
-                status = "✓ 激活" if user['is_active'] else "✗ 停用"
-                print(f"  - {user['username']:10s} [{user['quota_tier']:8s}] {status}")
-            return True
-        else:
-            print(f"✗ 获取用户列表失败: {response.status_code}")
-            return False
+    response = SESSION.get(
+        f"{admin_api_base}/users",
+        timeout=5.0
+    )
 
-    except Exception as e:
-        print(f"✗ 测试失败: {e}")
+    if response.status_code == 200:
+        result = rjson(response)
+        users = result['users']
+        print(f"✓ 成功获取用户列表 (共 {len(users)} 个用户):\n")
+        for user in users:
+            status = "✓ 激活" if user['is_active'] else "✗ 停用"
+            print(f"  - {user['username']:10s} [{user['quota_tier']:8s}] {status}")
+        return True
+    else:
+        print(f"✗ 获取用户列表失败: {response.status_code}")
         return False
 
 
-def test_invalid_username_creation():
-    """测试创建非法用户名应该被拒绝（修复 B11）"""
+async def create_user(client: httpx.AsyncClient, username: str, password: str = "test123",
+                      quota_tier: str = "basic") -> httpx.Response:
+    """管理接口：创建用户，由调用方检查状态码"""
+    return await client.post(
+        f"{ADMIN_PATH}/users",
+        json={
+            "username": username,
+            "password": password,
+            "quota_tier": quota_tier
+        },
+        timeout=5.0
+    )
+
+
+@catching("✗ 测试失败")
+async def test_invalid_username_creation():
+    """测试创建非法用户名应该被拒绝（修复 B11）
+    
+    各用例互不依赖，同一组用例的创建请求一轮并发发出，再按用例顺序输出结果。
+    """
     print_section("测试 10: 非法用户名校验")
 
-    admin_api_base = f"{PROXY_URL}/admin"
+    client = async_session()
 
     # 定义各种非法用户名测试用例
     invalid_usernames = [
@@ -551,125 +796,115 @@ def test_invalid_username_creation():
         ("用户名", "包含中文字符"),
     ]
 
-    try:
-        success_count = 0
-        failed_cases = []
-
-        print("测试各种非法用户名...\n")
+    success_count = 0
+    failed_cases = []
 
-        for username, description in invalid_usernames:
-            display_name = repr(username) if len(username) <= 20 else f"{repr(username[:20])}..."
-            
-            try:
-                response = httpx.post(
-                    f"{admin_api_base}/users",
-                    json={
-                        "username": username,
-                        "password": "test123",
-                        "quota_tier": "basic"
-                    },
-                    timeout=5.0
-                )
+    print("测试各种非法用户名...\n")
 
-                if response.status_code == 400:
-                    error_data = response.json()
-                    print(f"✓ {display_name:30s} - 正确拒绝 ({description})")
-                    print(f"  错误信息: {error_data.get('error', {}).get('message', 'N/A')}")
-                    success_count += 1
-                elif response.status_code == 500 and "用户" in response.text and "已存在" in response.text:
-                    # 已存在的用户（如果之前测试创建过）
-                    print(f"⚠ {display_name:30s} - 用户已存在 ({description})")
-                    success_count += 1
-                else:
-                    print(f"✗ {display_name:30s} - 应该拒绝但接受了 ({description})")
-                    print(f"  状态码: {response.status_code}, 响应: {response.text[:100]}")
-                    failed_cases.append((username, description))
-
-            except Exception as e:
-                print(f"✗ {display_name:30s} - 测试异常: {e}")
+    responses = await asyncio.gather(
+        *(create_user(client, username) for username, _ in invalid_usernames),
+        return_exceptions=True
+    )
+    for (username, description), response in zip(invalid_usernames, responses):
+        display_name = repr(username) if len(username) <= 20 else f"{repr(username[:20])}..."
+        
+        try:
+            if isinstance(response, BaseException):
+                raise response
+
+            if response.status_code == 400:
+                error_data = rjson(response)
+                print(f"✓ {display_name:30s} - 正确拒绝 ({description})")
+                print(f"  错误信息: {error_data.get('error', {}).get('message', 'N/A')}")
+                success_count += 1
+            elif response.status_code == 500 and "用户" in response.text and "已存在" in response.text:
+                # 已存在的用户（如果之前测试创建过）
+                print(f"⚠ {display_name:30s} - 用户已存在 ({description})")
+                success_count += 1
+            else:
+                print(f"✗ {display_name:30s} - 应该拒绝但接受了 ({description})")
+                print(f"  状态码: {response.status_code}, 响应: {response.text[:100]}")
                 failed_cases.append((username, description))
 
-        # 测试合法用户名（应该能创建成功）
-        print("\n测试合法用户名（应该成功）...\n")
-        
-        valid_usernames = [
-            ("user123", "字母+数字"),
-            ("test_user", "包含下划线"),
-            ("test-user", "包含连字符"),
-            ("abc", "最短合法长度 (3)"),
-            ("a" * 32, "最长合法长度 (32)"),
-            ("123test", "以数字开头"),
-        ]
-
-        valid_success_count = 0
-        for username, description in valid_usernames:
-            try:
-                response = httpx.post(
-                    f"{admin_api_base}/users",
-                    json={
-                        "username": username,
-                        "password": "test123",
-                        "quota_tier": "basic"
-                    },
-                    timeout=5.0
-                )
+        except httpx.HTTPError as e:
+            print(f"✗ {display_name:30s} - 测试异常: {e}")
+            failed_cases.append((username, description))
 
-                if response.status_code in [200, 201]:
-                    print(f"✓ {username:30s} - 创建成功 ({description})")
-                    valid_success_count += 1
-                    # 清理：停用测试用户
-                    httpx.post(
-                        f"{admin_api_base}/users/{username}/active",
-                        json={"is_active": False},
-                        timeout=5.0
-                    )
-                elif response.status_code == 500 and "已存在" in response.text:
-                    print(f"✓ {username:30s} - 用户已存在 (视为成功) ({description})")
-                    valid_success_count += 1
-                else:
-                    print(f"✗ {username:30s} - 创建失败: {response.status_code}")
-                    print(f"  响应: {response.text[:100]}")
-
-            except Exception as e:
-                print(f"✗ {username:30s} - 测试异常: {e}")
-
-        # 汇总结果
-        print(f"\n{'='*60}")
-        print(f"非法用户名测试: {success_count}/{len(invalid_usernames)} 正确拒绝")
-        print(f"合法用户名测试: {valid_success_count}/{len(valid_usernames)} 成功创建")
-
-        if failed_cases:
-            print(f"\n未正确拒绝的非法用户名:")
-            for username, desc in failed_cases:
-                print(f"  - {repr(username)}: {desc}")
-
-        # 只要大部分非法用户名被正确拒绝即可通过
-        if success_count >= len(invalid_usernames) * 0.8 and valid_success_count >= len(valid_usernames) * 0.8:
-            print("\n✓ 用户名校验测试基本通过!")
-            return True
-        else:
-            print("\n✗ 用户名校验测试未通过")
-            return False
+    # 测试合法用户名（应该能创建成功）
+    print("\n测试合法用户名（应该成功）...\n")
+    
+    valid_usernames = [
+        ("user123", "字母+数字"),
+        ("test_user", "包含下划线"),
+        ("test-user", "包含连字符"),
+        ("abc", "最短合法长度 (3)"),
+        ("a" * 32, "最长合法长度 (32)"),
+        ("123test", "以数字开头"),
+    ]
 
-    except Exception as e:
-        print(f"✗ 测试失败: {e}")
-        import traceback
-        traceback.print_exc()
+    valid_success_count = 0
+    created_usernames = []
+    responses = await asyncio.gather(
+        *(create_user(client, username) for username, _ in valid_usernames),
+        return_exceptions=True
+    )
+    for (username, description), response in zip(valid_usernames, responses):
+        try:
+            if isinstance(response, BaseException):
+                raise response
+
+            if response.status_code in [200, 201]:
+                print(f"✓ {username:30s} - 创建成功 ({description})")
+                valid_success_count += 1
+                created_usernames.append(username)
+            elif response.status_code == 500 and "已存在" in response.text:
+                print(f"✓ {username:30s} - 用户已存在 (视为成功) ({description})")
+                valid_success_count += 1
+            else:
+                print(f"✗ {username:30s} - 创建失败: {response.status_code}")
+                print(f"  响应: {response.text[:100]}")
+
+        except httpx.HTTPError as e:
+            print(f"✗ {username:30s} - 测试异常: {e}")
+
+    # 清理：停用新建的测试用户 (同样一轮并发发出，失败不影响结果)
+    await asyncio.gather(
+        *(set_user_active(client, username, False) for username in created_usernames),
+        return_exceptions=True
+    )
+
+    # 汇总结果
+    print(f"\n{'='*60}")
+    print(f"非法用户名测试: {success_count}/{len(invalid_usernames)} 正确拒绝")
+    print(f"合法用户名测试: {valid_success_count}/{len(valid_usernames)} 成功创建")
+
+    if failed_cases:
+        print(f"\n未正确拒绝的非法用户名:")
+        for username, desc in failed_cases:
+            print(f"  - {repr(username)}: {desc}")
+
+    # 只要大部分非法用户名被正确拒绝即可通过
+    if success_count >= len(invalid_usernames) * 0.8 and valid_success_count >= len(valid_usernames) * 0.8:
+        print("\n✓ 用户名校验测试基本通过!")
+        return True
+    else:
+        print("\n✗ 用户名校验测试未通过")
         return False
 
 
+@catching("✗ 测试失败")
 def test_new_user_can_use_service():
     """测试通过Admin API创建的新用户能够使用服务（覆盖Bug #1）"""
     print_section("测试 11: 新用户可以使用服务")
 
-    admin_api_base = f"{PROXY_URL}/admin"
+    admin_api_base = ADMIN_PATH
     test_username = "test_newuser"
     test_password = "newpass123"
 
     try:
         # 1. 创建新用户
         print(f"1. 通过Admin API创建新用户 '{test_username}'...")
-        response = httpx.post(
+        response = SESSION.post(
             f"{admin_api_base}/users",
             json={
                 "username": test_username,
@@ -681,16 +916,16 @@ def test_new_user_can_use_service():
 
         # 如果用户已存在，先确保是激活状态
         if response.status_code == 200:
-            result = response.json()
+            result = rjson(response)
             print(f"  用户已存在，确保激活状态...")
-            httpx.post(
+            SESSION.post(
                 f"{admin_api_base}/users/{test_username}/active",
                 json={"is_active": True},
                 timeout=5.0
             )
             print(f"✓ 使用已存在的用户: {result['username']}")
         elif response.status_code == 201:
-            result = response.json()
+            result = rjson(response)
             print(f"✓ 用户创建成功: {result['username']} (quota_tier: {result['quota_tier']})")
         else:
             print(f"✗ 创建用户失败: {response.status_code} - {response.text}")
@@ -698,9 +933,10 @@ def test_new_user_can_use_service():
 
         # 2. 新用户登录
         print(f"\n2. 新用户登录...")
-        login_response = httpx.post(
-            LOGIN_ENDPOINT,
-            json={"username": test_username, "password": test_password},
+        login_response = SESSION.post(
+            LOGIN_PATH,
+            content=login_body(test_username, test_password),
+            headers=JSON_HEADERS,
             timeout=5.0
         )
 
@@ -708,7 +944,7 @@ def test_new_user_can_use_service():
             print(f"✗ 新用户登录失败: {login_response.status_code} - {login_response.text}")
             return False
 
-        token = login_response.json()["token"]
+        token = rjson(login_response)["token"]
         print(f"✓ 新用户登录成功，Token: {token[:20]}...")
 
         # 3. 使用新用户调用 chat 接口（这是核心测试：验证配额系统能找到动态创建的用户）
@@ -721,10 +957,10 @@ def test_new_user_can_use_service():
                 response_text = "".join(client.chat(messages))
                 print(f"✓ 新用户成功调用 chat 接口")
                 print(f"  响应: {response_text[:30]}...")
-            except Exception as e:
+            except httpx.HTTPError as e:
                 print(f"✗ 新用户调用 chat 失败: {e}")
                 # 清理：停用用户
-                httpx.post(
+                SESSION.post(
                     f"{admin_api_base}/users/{test_username}/active",
                     json={"is_active": False},
                     timeout=5.0
@@ -733,45 +969,126 @@ def test_new_user_can_use_service():
 
         # 4. 验证配额已被扣除
         print(f"\n4. 验证配额已被扣除...")
-        user_info_response = httpx.get(
+        user_info_response = SESSION.get(
             f"{admin_api_base}/users/{test_username}",
             timeout=5.0
         )
 
         if user_info_response.status_code == 200:
-            user_info = user_info_response.json()
+            user_info = rjson(user_info_response)
             print(f"✓ 用户信息: {user_info}")
 
         # 5. 清理：停用测试用户
         print(f"\n5. 清理测试用户...")
-        cleanup_response = httpx.post(
+        cleanup_response = SESSION.post(
             f"{admin_api_base}/users/{test_username}/active",
             json={"is_active": False},
             timeout=5.0
         )
 
         if cleanup_response.status_code == 200:
+            invalidate_token(test_username)
             print(f"✓ 测试用户已停用")
 
         print("\n✓ 所有新用户测试通过! (Bug #1 已修复)")
         return True
 
-    except Exception as e:
-        print(f"✗ 测试失败: {e}")
-        import traceback
-        traceback.print_exc()
-
-        # 尝试清理
+    except (httpx.HTTPError, KeyError, ValueError):
+        # 尝试清理，异常交给 @catching 报告
         try:
-            httpx.post(
+            SESSION.post(
                 f"{admin_api_base}/users/{test_username}/active",
                 json={"is_active": False},
                 timeout=5.0
             )
-        except:
+        except httpx.HTTPError:
             pass
+        raise
+
+
+# 当前测试的输出缓冲区；每个测试任务有独立的上下文，asyncio.to_thread 会把上下文带入工作线程
+_capture: contextvars.ContextVar[io.StringIO | None] = contextvars.ContextVar("_capture", default=None)
+
+
+class _CapturingStdout:
+    """按测试缓冲输出：并发执行的测试各自写入缓冲区，结束后整体打印，避免输出交错"""
+    
+    def __init__(self, stream):
+        self._stream = stream
+    
+    def write(self, text: str) -> int:
+        buffer = _capture.get()
+        return (buffer if buffer is not None else self._stream).write(text)
+    
+    def flush(self):
+        if _capture.get() is None:
+            self._stream.flush()
+    
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+async def run_captured(test_func) -> tuple[bool, str]:
+    """执行单个测试并缓冲其输出，返回 (结果, 输出)
+    
+    同步测试放到线程中执行，不阻塞事件循环。
+    """
+    buffer = io.StringIO()
+    _capture.set(buffer)
+    try:
+        if inspect.iscoroutinefunction(test_func):
+            success = await test_func()
+        else:
+            success = await asyncio.to_thread(test_func)
+    except Exception as e:
+        print(f"\n✗ 测试异常: {e}")
+        success = False
+    finally:
+        _capture.set(None)
+    return success, buffer.getvalue()
+
+
+async def run_all(tests: list) -> list[tuple[str, bool]]:
+    """按依赖关系并发执行测试，输出按列表顺序整体打印
+    
+    tests 为 (名称, 测试函数, 依赖的测试名称) 列表，依赖只能指向列表中更靠前的测试；
+    每个测试在其依赖全部结束后启动 (依赖失败不影响执行)。
+    异步测试共享同一个 AsyncClient，整个测试流程结束后关闭。
+    """
+    global ASYNC_SESSION
+    tasks: dict[str, asyncio.Task] = {}
+    
+    async def run_after(test_func, deps: list[asyncio.Task]) -> tuple[bool, str]:
+        if deps:
+            await asyncio.wait(deps)
+        return await run_captured(test_func)
+    
+    results = []
+    async with make_async_client(http2=USE_HTTP2) as ASYNC_SESSION:
+        for name, test_func, depends_on in tests:
+            tasks[name] = asyncio.create_task(run_after(test_func, [tasks[dep] for dep in depends_on]))
+        
+        # 按列表顺序等待并打印，前面的测试结束后即可看到其输出
+        for name, _, _ in tests:
+            success, output = await tasks[name]
+            sys.stdout.write(output)
+            results.append((name, success))
+    ASYNC_SESSION = None
+    
+    return results
+
+
+def _loop_factory():
+    """有 uvloop 时使用 uvloop 事件循环 (Windows 上没有 uvloop，回退默认循环)"""
+    try:
+        import uvloop
+    except ImportError:
+        return None
+    return uvloop.new_event_loop
 
-        return False
+
+# 总结中的结果标记，按 bool(结果) 索引
+STATUS_GLYPHS = ("✗ 失败", "✓ 通过")
 
 
 def main():
@@ -782,59 +1099,63 @@ def main():
     print(f"\n代理地址: {PROXY_URL}")
     print(f"测试账号: {USERNAME}\n")
     
-    # 检查服务是否运行
+    # 检查服务是否运行 (仅探测 TCP 端口，不经过 HTTP/认证接口)
+    proxy_addr = urlsplit(PROXY_URL)
     try:
-        response = httpx.get(f"{PROXY_URL}/auth/login", timeout=2.0)
-    except Exception:
+        socket.create_connection((proxy_addr.hostname, proxy_addr.port or 80), timeout=0.5).close()
+    except OSError:
         print("❌ 错误: 代理服务未启动!")
         print("   请先运行: .\\start.ps1")
         sys.exit(1)
     
-    # 运行测试
+    # 远程部署时端口可能由反向代理占用，可额外用 HTTP 探测服务本身 (如 TEST_HEALTH_PATH=/metrics)
+    if HEALTH_PATH:
+        try:
+            SESSION.head(HEALTH_PATH, timeout=2.0).raise_for_status()
+        except httpx.HTTPError as e:
+            print(f"❌ 错误: 代理服务健康检查失败 ({HEALTH_PATH}): {e}")
+            sys.exit(1)
+    
+    # 运行测试：互不影响的测试并发执行；使用 admin Token 对话的测试共享服务端
+    # 的 Token 串行/限流状态，通过依赖依次执行
     tests = [
-        ("登录认证", test_login),
-        ("登录缓存 (60秒)", test_login_cache),
-        ("流式对话", test_chat_stream),
-        ("Token串行限流", test_token_serial),
-        ("多用户并发", test_multi_user_concurrent),
-        ("基础并发测试", test_rate_limit),
-        ("未授权拦截", test_unauthorized),
-        ("用户激活状态管理", test_user_active_management),
-        ("列出所有用户", test_admin_list_users),
-        ("非法用户名校验 (Bug #B11)", test_invalid_username_creation),
-        ("新用户可以使用服务 (Bug #1)", test_new_user_can_use_service),
+        ("登录认证", test_login, ()),
+        ("登录缓存 (60秒)", test_login_cache, ()),
+        ("流式对话", test_chat_stream, ("登录认证",)),
+        ("Token串行限流", test_token_serial, ("流式对话",)),
+        ("多用户并发", test_multi_user_concurrent, ("Token串行限流",)),
+        ("基础并发测试", test_rate_limit, ("多用户并发",)),
+        ("未授权拦截", test_unauthorized, ()),
+        ("用户激活状态管理", test_user_active_management, ()),
+        ("列出所有用户", test_admin_list_users, ()),
+        ("非法用户名校验 (Bug #B11)", test_invalid_username_creation, ()),
+        ("新用户可以使用服务 (Bug #1)", test_new_user_can_use_service, ()),
     ]
     
-    results = []
-    for name, test_func in tests:
-        try:
-            success = test_func()
-            results.append((name, success))
-        except KeyboardInterrupt:
-            print("\n\n⚠️  测试被用户中断")
-            sys.exit(1)
-        except Exception as e:
-            print(f"\n✗ 测试异常: {e}")
-            results.append((name, False))
+    sys.stdout = _CapturingStdout(sys.stdout)
+    try:
+        results = asyncio.run(run_all(tests), loop_factory=_loop_factory())
+    except KeyboardInterrupt:
+        print("\n\n⚠️  测试被用户中断")
+        sys.exit(1)
     
     # 输出总结
     print_section("测试总结")
     
-    passed = sum(1 for _, success in results if success)
-    total = len(results)
-    
+    passed = 0
+    lines = []
     for name, success in results:
-        status = "✓ 通过" if success else "✗ 失败"
-        print(f"{status} - {name}")
-    
-    print(f"\n总计: {passed}/{total} 通过")
+        passed += bool(success)
+        lines.append(f"{STATUS_GLYPHS[bool(success)]} - {name}")
+    total = len(results)
     
+    lines.append(f"\n总计: {passed}/{total} 通过")
     if passed == total:
-        print("\n🎉 所有测试通过!")
-        sys.exit(0)
+        lines.append("\n🎉 所有测试通过!")
     else:
-        print(f"\n⚠️  {total - passed} 个测试失败")
-        sys.exit(1)
+        lines.append(f"\n⚠️  {total - passed} 个测试失败")
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.exit(0 if passed == total else 1)
 
 
 if __name__ == "__main__":
@@ -31,9 +31,11 @@
   CREATE_USERS        是否创建缺失用户 (1/0, 默认 1)
   CLEANUP_USERS       测试后停用用户 (1/0, 默认 0)
   TIMEOUT             单请求超时秒数 (默认 20)
+  HTTP2               启用 HTTP/2 (1/0, 默认 0, 需安装 httpx[http2])
+  DEBUG_SNIPPET       解析成功响应并记录回复片段 (1/0, 默认 0)
     PARALLEL_CREATE     并发创建用户 (默认 1=启用)
-    PARALLEL_CREATE_WORKERS  并发创建线程数 (默认 30)
-    PARALLEL_ACTIVATE_WORKERS 并发激活线程数 (默认 30)
+    PARALLEL_CREATE_WORKERS  并发创建数 (默认 30)
+    PARALLEL_ACTIVATE_WORKERS 并发激活数 (默认 30)
 
 注意: 管理接口无需认证 (假设仅限 localhost), 若未来改为需要 admin token, 需在脚本中补充。
 """
@@ -46,17 +48,17 @@ import time
 import math
 import json
 import random
+from collections import Counter
 from dataclasses import dataclass, field
 from pathlib import Path
 import shutil
-from statistics import mean, median
-from typing import List, Dict, Tuple, Any
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from statistics import fmean
+from typing import List, Dict, Tuple, Any, Iterable
+import asyncio
+import heapq
 
 import httpx
-
-# 共享客户端减少握手开销
-SHARED_CLIENT = httpx.Client(timeout=REQUEST_TIMEOUT)
+import orjson
 
 # -------------------------- 配置 --------------------------
 
@@ -83,6 +85,33 @@ MAX_429_RETRY = int(os.getenv("MAX_429_RETRY", "2"))
 RAMP_BATCH_SIZE = int(os.getenv("RAMP_BATCH_SIZE", "25"))
 RAMP_INTERVAL = float(os.getenv("RAMP_INTERVAL", "1.5"))
 REPORT_JSON = os.getenv("REPORT_JSON")  # 若设置则输出 JSON 报告
+DEBUG_SNIPPET = os.getenv("DEBUG_SNIPPET", "0") == "1"  # 是否解析成功响应并记录回复片段 (默认不解析)
+PARALLEL_CREATE = os.getenv("PARALLEL_CREATE", "1") == "1"
+PARALLEL_CREATE_WORKERS = int(os.getenv("PARALLEL_CREATE_WORKERS", "30"))
+PARALLEL_ACTIVATE_WORKERS = int(os.getenv("PARALLEL_ACTIVATE_WORKERS", "30"))
+
+HTTP2 = os.getenv("HTTP2", "0") == "1"  # 需安装 httpx[http2]; 明文 http 代理上 httpx 不做 h2c 升级
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+# 共享异步客户端：所有请求在同一个事件循环里复用连接池 (在 asyncio.run 内首次使用，结束时 aclose)
+# 连接池按最大并发定容，保证每个在途请求都能复用 keep-alive 连接，不因池满而重新建连
+SHARED_CLIENT = httpx.AsyncClient(
+    timeout=REQUEST_TIMEOUT,
+    http2=HTTP2 and _http2_available(),
+    limits=httpx.Limits(
+        max_connections=max(200, BURST_CONCURRENCY * 2),
+        max_keepalive_connections=max(100, BURST_CONCURRENCY),
+    ),
+)
+
+# chat 请求体的固定部分，每次请求只补充 messages
+CHAT_PAYLOAD_TEMPLATE = {"model": "deepseek-chat", "stream": False}
 
 RANDOM_SEED = int(os.getenv("RANDOM_SEED", str(int(time.time()))))
 random.seed(RANDOM_SEED)
@@ -105,73 +134,91 @@ class TokenInfo:
     expires_at: float  # epoch seconds
     username: str
     issued_at: float
+    headers: Dict[str, str] = field(init=False, repr=False)  # 登录时生成一次，每次请求复用
+
+    def __post_init__(self):
+        self.headers = {"Authorization": f"Bearer {self.token}"}
+
+def _percentile(sorted_vals: List[float], p: float) -> float:
+    """最近秩分位数，输入须已升序"""
+    if not sorted_vals:
+        return 0.0
+    return sorted_vals[min(len(sorted_vals) - 1, math.ceil(p * len(sorted_vals)) - 1)]
+
+def _median_sorted(sorted_vals: List[float]) -> float:
+    """已排序列表的中位数 (statistics.median 会再排序一次)"""
+    n = len(sorted_vals)
+    if not n:
+        return 0.0
+    mid = n // 2
+    return sorted_vals[mid] if n % 2 else (sorted_vals[mid - 1] + sorted_vals[mid]) / 2
+
+def _error_category(r: RequestResult) -> str:
+    if r.error == "timeout":
+        return "timeout"
+    if r.status == 401:
+        return "auth"
+    if r.status == 429:
+        return "rate_limit"
+    if r.status and (500 <= r.status < 600):
+        return "upstream"
+    return "other"
 
 @dataclass
 class Metrics:
     phase: str
     results: List[RequestResult] = field(default_factory=list)
+    # summary() 结果缓存；results 只通过 add_results() 追加，追加时清空缓存
+    _summary: Dict[str, Any] | None = field(default=None, init=False, repr=False)
+
+    def add_results(self, items: Iterable[RequestResult]):
+        self.results.extend(items)
+        self._summary = None
 
     def latency_list(self) -> List[float]:
         return [r.elapsed for r in self.results if r.ok]
 
     def summary(self) -> Dict[str, Any]:
-        total = len(self.results)
-        successes = sum(1 for r in self.results if r.ok)
-        failures = total - successes
-        latency = self.latency_list()
-        latency.sort()
-        def pct(p: float) -> float:
-            if not latency:
-                return 0.0
-            idx = min(len(latency) - 1, math.ceil(p * len(latency)) - 1)
-            return latency[idx]
-        fail_latencies = [r.elapsed for r in self.results if not r.ok]
-        fail_avg = mean(fail_latencies) if fail_latencies else 0.0
-        fail_p95 = 0.0
-        if fail_latencies:
-            fl_sorted = sorted(fail_latencies)
-            fail_p95 = fl_sorted[min(len(fl_sorted)-1, math.ceil(0.95*len(fl_sorted))-1)]
-        # 错误分类细分
+        if self._summary is not None:
+            return self._summary
+        # 单次遍历同时收集成功/失败延迟、错误分类与错误分布
+        latency: List[float] = []
+        fail_latencies: List[float] = []
+        buckets: Counter[str] = Counter()
         cat = {"auth":0, "rate_limit":0, "upstream":0, "timeout":0, "other":0}
         for r in self.results:
             if r.ok:
+                latency.append(r.elapsed)
                 continue
-            if r.error == "timeout":
-                cat["timeout"] += 1
-            elif r.status == 401:
-                cat["auth"] += 1
-            elif r.status == 429:
-                cat["rate_limit"] += 1
-            elif r.status and (500 <= r.status < 600):
-                cat["upstream"] += 1
-            else:
-                cat["other"] += 1
-        return {
+            fail_latencies.append(r.elapsed)
+            cat[_error_category(r)] += 1
+            buckets[r.error or (f"HTTP_{r.status}" if r.status else "unknown")] += 1
+        total = len(self.results)
+        successes = len(latency)
+        # 只排序一次: min/max/median/分位数都直接从有序列表取
+        latency.sort()
+        fail_latencies.sort()
+        self._summary = {
             "phase": self.phase,
             "total": total,
             "successes": successes,
-            "failures": failures,
+            "failures": total - successes,
             "success_rate": (successes / total * 100) if total else 0.0,
-            "latency_min": min(latency) if latency else 0.0,
-            "latency_max": max(latency) if latency else 0.0,
-            "latency_avg": mean(latency) if latency else 0.0,
-            "latency_median": median(latency) if latency else 0.0,
-            "latency_p95": pct(0.95),
-            "latency_p99": pct(0.99),
-            "errors": self.error_breakdown(),
-            "fail_latency_avg": fail_avg,
-            "fail_latency_p95": fail_p95,
+            "latency_min": latency[0] if latency else 0.0,
+            "latency_max": latency[-1] if latency else 0.0,
+            "latency_avg": fmean(latency) if latency else 0.0,
+            "latency_median": _median_sorted(latency),
+            "latency_p95": _percentile(latency, 0.95),
+            "latency_p99": _percentile(latency, 0.99),
+            "errors": dict(buckets),
+            "fail_latency_avg": fmean(fail_latencies) if fail_latencies else 0.0,
+            "fail_latency_p95": _percentile(fail_latencies, 0.95),
             "error_categories": cat,
         }
+        return self._summary
 
     def error_breakdown(self) -> Dict[str, int]:
-        buckets: Dict[str, int] = {}
-        for r in self.results:
-            if r.ok:
-                continue
-            key = r.error or (f"HTTP_{r.status}" if r.status else "unknown")
-            buckets[key] = buckets.get(key, 0) + 1
-        return buckets
+        return dict(self.summary()["errors"])
 
 # -------------------------- 工具函数 --------------------------
 
@@ -180,25 +227,25 @@ def print_section(title: str):
     print(f"  {title}")
     print("=" * 70 + "\n")
 
-def create_user(username: str, password: str, quota_tier: str, client: httpx.Client) -> str:
+async def create_user(username: str, password: str, quota_tier: str, client: httpx.AsyncClient) -> str:
     """创建单个用户
     返回: 'new' 新建; 'ok' 已存在或激活成功; 'fail' 失败
     """
     try:
-        resp = client.post(
+        resp = await client.post(
             f"{ADMIN_BASE}/users",
             json={"username": username, "password": password, "quota_tier": quota_tier},
             timeout=REQUEST_TIMEOUT,
         )
         if resp.status_code == 201:
-            client.post(
+            await client.post(
                 f"{ADMIN_BASE}/users/{username}/active",
                 json={"is_active": True},
                 timeout=REQUEST_TIMEOUT,
             )
             return 'new'
         if resp.status_code == 200 or (resp.status_code == 500 and "已存在" in resp.text):
-            client.post(
+            await client.post(
                 f"{ADMIN_BASE}/users/{username}/active",
                 json={"is_active": True},
                 timeout=REQUEST_TIMEOUT,
@@ -208,7 +255,15 @@ def create_user(username: str, password: str, quota_tier: str, client: httpx.Cli
     except Exception:
         return 'fail'
 
-def create_users(count: int) -> Tuple[List[str], List[str]]:
+async def gather_limited(limit: int, coros) -> list:
+    """并发执行协程，同时在途的数量不超过 limit (代替固定大小的线程池)，结果按输入顺序返回"""
+    sem = asyncio.Semaphore(max(1, limit))
+    async def run(coro):
+        async with sem:
+            return await coro
+    return await asyncio.gather(*(run(c) for c in coros))
+
+async def create_users(count: int) -> Tuple[List[str], List[str]]:
     print(f"创建用户 (count={count}, create={CREATE_USERS}, parallel={PARALLEL_CREATE}) ...")
     usernames = [f"{BASE_USERNAME}{i:03d}" for i in range(count)]
     created: List[str] = []
@@ -216,32 +271,22 @@ def create_users(count: int) -> Tuple[List[str], List[str]]:
         print("跳过创建用户，根据前缀假定已经存在并激活。")
         return usernames, created
     if PARALLEL_CREATE:
-        # 第一阶段: 并发创建
+        # 并发创建 (create_user 成功路径内已完成激活，无需整体再激活一遍)
         print(f"并发创建阶段 workers={PARALLEL_CREATE_WORKERS} ...")
-        results: Dict[str, str] = {}
-        def create_task(u: str):
-            return u, create_user(u, USER_PASSWORD, QUOTA_TIER, SHARED_CLIENT)
-        with ThreadPoolExecutor(max_workers=PARALLEL_CREATE_WORKERS) as executor:
-            futures = [executor.submit(create_task, u) for u in usernames]
-            for fut in as_completed(futures):
-                u, status = fut.result()
-                results[u] = status
-        # 第二阶段: 对未激活成功的用户再次激活 (避免 race)
-        to_activate = [u for u, s in results.items() if s in ('new','ok')]
-        print(f"并发激活阶段 users={len(to_activate)} workers={PARALLEL_ACTIVATE_WORKERS} ...")
-        def activate(u: str):
-            try:
-                SHARED_CLIENT.post(
-                    f"{ADMIN_BASE}/users/{u}/active",
-                    json={"is_active": True},
-                    timeout=REQUEST_TIMEOUT,
-                )
-            except Exception:
-                pass
-        with ThreadPoolExecutor(max_workers=PARALLEL_ACTIVATE_WORKERS) as executor:
-            futures = [executor.submit(activate, u) for u in to_activate]
-            for _ in as_completed(futures):
-                pass
+        statuses = await gather_limited(
+            PARALLEL_CREATE_WORKERS,
+            (create_user(u, USER_PASSWORD, QUOTA_TIER, SHARED_CLIENT) for u in usernames),
+        )
+        results: Dict[str, str] = dict(zip(usernames, statuses))
+        # 仅对失败的用户重试一次 (已存在时 create_user 会走激活分支)
+        retry = [u for u, s in results.items() if s == 'fail']
+        if retry:
+            print(f"重试失败用户 users={len(retry)} workers={PARALLEL_ACTIVATE_WORKERS} ...")
+            retried = await gather_limited(
+                PARALLEL_ACTIVATE_WORKERS,
+                (create_user(u, USER_PASSWORD, QUOTA_TIER, SHARED_CLIENT) for u in retry),
+            )
+            results.update(zip(retry, retried))
         new_cnt = sum(1 for s in results.values() if s == 'new')
         ok_cnt = sum(1 for s in results.values() if s in ('new','ok'))
         created = [u for u, s in results.items() if s == 'new']
@@ -251,7 +296,7 @@ def create_users(count: int) -> Tuple[List[str], List[str]]:
     new_cnt = 0
     ok_cnt = 0
     for u in usernames:
-        r = create_user(u, USER_PASSWORD, QUOTA_TIER, SHARED_CLIENT)
+        r = await create_user(u, USER_PASSWORD, QUOTA_TIER, SHARED_CLIENT)
         if r == 'new':
             new_cnt += 1
             ok_cnt += 1
@@ -261,16 +306,16 @@ def create_users(count: int) -> Tuple[List[str], List[str]]:
     print(f"用户创建/激活完成: ok={ok_cnt}/{count} (new={new_cnt})")
     return usernames, created
 
-def login_user(username: str, password: str) -> TokenInfo | None:
+async def login_user(username: str, password: str) -> TokenInfo | None:
     for attempt in range(2):
         try:
-            resp = SHARED_CLIENT.post(
+            resp = await SHARED_CLIENT.post(
                 LOGIN_ENDPOINT,
                 json={"username": username, "password": password},
                 timeout=REQUEST_TIMEOUT,
             )
             if resp.status_code == 200:
-                data = resp.json()
+                data = orjson.loads(resp.content)
                 token = data.get("token")
                 expires_in = data.get("expires_in", 60)
                 if token:
@@ -282,133 +327,167 @@ def login_user(username: str, password: str) -> TokenInfo | None:
         except Exception:
             if attempt == 1:
                 return None
-            time.sleep(0.2)
+            await asyncio.sleep(0.2)
     return None
 
-def login_users(usernames: List[str]) -> Dict[str, TokenInfo]:
+async def login_users(usernames: List[str]) -> Dict[str, TokenInfo]:
     print(f"并发登录 {len(usernames)} 用户 ...")
     tokens: Dict[str, TokenInfo] = {}
-    with ThreadPoolExecutor(max_workers=50) as executor:
-    futures = {executor.submit(login_user, u, USER_PASSWORD): u for u in usernames}
-        for fut in as_completed(futures):
-            u = futures[fut]
-            info = fut.result()
-            if info:
-                tokens[u] = info
+    infos = await gather_limited(50, (login_user(u, USER_PASSWORD) for u in usernames))
+    for u, info in zip(usernames, infos):
+        if info:
+            store_token(tokens, info)
     print(f"登录成功: {len(tokens)}/{len(usernames)}")
     if len(tokens) < len(usernames):
         print("⚠ 部分用户登录失败，后续请求只使用成功登录的用户。")
     return tokens
 
-def ensure_tokens_valid(tokens: Dict[str, TokenInfo]):
+# 按过期时间排序的最小堆 (expires_at, username)，只弹出即将过期的 token，不必每轮扫描全部用户。
+# token 被替换后旧条目留在堆里，弹出时与当前 token 的 expires_at 不一致即跳过。
+_TOKEN_HEAP: List[Tuple[float, str]] = []
+
+def store_token(tokens: Dict[str, TokenInfo], info: TokenInfo):
+    """保存 (新) token 并登记到过期堆"""
+    tokens[info.username] = info
+    heapq.heappush(_TOKEN_HEAP, (info.expires_at, info.username))
+
+# 正在进行的按需刷新 (username -> 登录任务)，并发的刷新请求共用同一个任务
+_REFRESH_INFLIGHT: Dict[str, asyncio.Task] = {}
+
+async def refresh_token(tokens: Dict[str, TokenInfo], user: str) -> TokenInfo | None:
+    """按需刷新单个用户的 token (401 / 即将过期时调用)
+
+    刚签发不久的 token 直接复用；同一用户同时发起的多次刷新合并为一次登录请求。
+    """
+    current = tokens.get(user)
+    if current is not None and time.time() - current.issued_at < min(TOKEN_REFRESH_GRACE, 2):
+        return current
+    task = _REFRESH_INFLIGHT.get(user)
+    if task is None:
+        async def refresh() -> TokenInfo | None:
+            try:
+                info = await login_user(user, USER_PASSWORD)
+                if info:
+                    store_token(tokens, info)
+                return info
+            finally:
+                _REFRESH_INFLIGHT.pop(user, None)
+        task = _REFRESH_INFLIGHT[user] = asyncio.create_task(refresh())
+    return await task
+
+async def ensure_tokens_valid(tokens: Dict[str, TokenInfo]):
     """刷新即将过期的 token"""
-    need_refresh = [u for u, ti in tokens.items() if ti.expires_at - time.time() < TOKEN_REFRESH_GRACE]
+    deadline = time.time() + TOKEN_REFRESH_GRACE
+    need_refresh: List[str] = []
+    while _TOKEN_HEAP and _TOKEN_HEAP[0][0] < deadline:
+        expires_at, u = heapq.heappop(_TOKEN_HEAP)
+        ti = tokens.get(u)
+        if ti is not None and ti.expires_at == expires_at:
+            need_refresh.append(u)
     if not need_refresh:
         return
     print(f"刷新即将过期 token: {len(need_refresh)}")
-    with ThreadPoolExecutor(max_workers=20) as executor:
-        futures = {executor.submit(login_user, u, USER_PASSWORD): u for u in need_refresh}
-        for fut in as_completed(futures):
-            u = futures[fut]
-            info = fut.result()
-            if info:
-                tokens[u] = info
-
-def send_chat(user: str, token_info: TokenInfo, content: str, phase: str, tokens_map: Dict[str, TokenInfo]) -> RequestResult:
-    start = time.time()
+    infos = await gather_limited(20, (login_user(u, USER_PASSWORD) for u in need_refresh))
+    for u, info in zip(need_refresh, infos):
+        if info:
+            store_token(tokens, info)
+        else:
+            # 刷新失败: 旧 token 放回堆中，下一轮再试
+            heapq.heappush(_TOKEN_HEAP, (tokens[u].expires_at, u))
+
+def _chat_snippet(body: bytes) -> str:
+    """调试用: 取回复内容前 30 字"""
+    try:
+        return orjson.loads(body)["choices"][0]["message"]["content"][:30]
+    except Exception:
+        return ""
+
+async def send_chat(user: str, token_info: TokenInfo, content: str, phase: str, tokens_map: Dict[str, TokenInfo]) -> RequestResult:
+    start = time.perf_counter_ns()
+    payload = {**CHAT_PAYLOAD_TEMPLATE, "messages": [{"role": "user", "content": content}]}
     attempt = 0
-    last_error = None
     while True:
-        headers = {"Authorization": f"Bearer {token_info.token}"}
-        payload = {
-            "model": "deepseek-chat",
-            "messages": [{"role": "user", "content": content}],
-            "stream": False,
-        }
         try:
-            resp = SHARED_CLIENT.post(CHAT_ENDPOINT, json=payload, headers=headers, timeout=REQUEST_TIMEOUT)
-            elapsed = time.time() - start
-            if resp.status_code == 200:
-                snippet = ""
-                try:
-                    data = resp.json()
-                    if "choices" in data:
-                        msg = data["choices"][0].get("message", {}).get("content", "")
-                        snippet = msg[:30]
-                except Exception:
-                    snippet = ""
-                return RequestResult(True, 200, None, elapsed, phase, snippet, retries=attempt)
-            # 401 处理: 刷新 token 重试一次
-            if resp.status_code == 401 and attempt == 0:
-                refreshed = login_user(user, USER_PASSWORD)
-                if refreshed:
-                    tokens_map[user] = refreshed
-                    token_info = refreshed
-                    attempt += 1
-                    continue
-                return RequestResult(False, 401, "HTTP_401", elapsed, phase, retries=attempt)
-            # 429 限流: 退避重试
-            if resp.status_code == 429 and RETRY_429 and attempt < MAX_429_RETRY:
-                backoff = (0.15 * (2 ** attempt))
-                time.sleep(backoff)
-                attempt += 1
-                continue
-            return RequestResult(False, resp.status_code, f"HTTP_{resp.status_code}", elapsed, phase, retries=attempt)
+            # 以流方式接收: 非调试模式下只把响应体读完丢弃 (保持连接可复用)，不拼接成完整 bytes
+            async with SHARED_CLIENT.stream("POST", CHAT_ENDPOINT, json=payload, headers=token_info.headers, timeout=REQUEST_TIMEOUT) as resp:
+                status = resp.status_code
+                if DEBUG_SNIPPET and status == 200:
+                    body = await resp.aread()
+                else:
+                    async for _ in resp.aiter_raw():
+                        pass
         except httpx.TimeoutException:
-            elapsed = time.time() - start
-            return RequestResult(False, None, "timeout", elapsed, phase, retries=attempt)
+            return RequestResult(False, None, "timeout", (time.perf_counter_ns() - start) / 1e9, phase, retries=attempt)
         except Exception as e:
-            elapsed = time.time() - start
-            last_error = e.__class__.__name__
-            return RequestResult(False, None, last_error, elapsed, phase, retries=attempt)
-
-def run_round(tokens: Dict[str, TokenInfo], phase: str) -> Metrics:
+            return RequestResult(False, None, e.__class__.__name__, (time.perf_counter_ns() - start) / 1e9, phase, retries=attempt)
+        elapsed = (time.perf_counter_ns() - start) / 1e9
+        if status == 200:
+            return RequestResult(True, 200, None, elapsed, phase, _chat_snippet(body) if DEBUG_SNIPPET else "", retries=attempt)
+        # 401: 刷新 token 后重试一次
+        if status == 401 and attempt == 0:
+            refreshed = await refresh_token(tokens_map, user)
+            if not refreshed:
+                return RequestResult(False, 401, "HTTP_401", elapsed, phase, retries=attempt)
+            token_info = refreshed
+        # 429 限流: 退避重试
+        elif status == 429 and RETRY_429 and attempt < MAX_429_RETRY:
+            await asyncio.sleep(0.15 * (2 ** attempt))
+        else:
+            return RequestResult(False, status, f"HTTP_{status}", elapsed, phase, retries=attempt)
+        attempt += 1
+
+async def run_round(tokens: Dict[str, TokenInfo], phase: str) -> Metrics:
     print(f"开始 {phase} 并发请求 (users={len(tokens)}) ...")
-    ensure_tokens_valid(tokens)
+    await ensure_tokens_valid(tokens)
     metrics = Metrics(phase)
     content = "说一个数字"
-    start_all = time.time()
+    start_all = time.perf_counter_ns()
     usernames = list(tokens.keys())
     batch_size = max(1, min(RAMP_BATCH_SIZE, len(usernames)))
-    idx = 0
-    with ThreadPoolExecutor(max_workers=min(100, len(tokens))) as executor:
-        futures = []
-        while idx < len(usernames):
-            batch = usernames[idx: idx + batch_size]
-            for u in batch:
-                futures.append(executor.submit(send_chat, u, tokens[u], content, phase, tokens))
-            idx += batch_size
-            if idx < len(usernames):
-                time.sleep(RAMP_INTERVAL)
-        for fut in as_completed(futures):
-            metrics.results.append(fut.result())
-    elapsed_all = time.time() - start_all
+    sem = asyncio.Semaphore(max(1, min(100, len(tokens))))
+    async def limited(k: int, u: str) -> RequestResult:
+        # 第 k 个请求按所在批次延后放行 (每批间隔 RAMP_INTERVAL)，主协程不再逐批 sleep
+        delay = (k // batch_size) * RAMP_INTERVAL
+        if delay:
+            await asyncio.sleep(delay)
+        async with sem:
+            return await send_chat(u, tokens[u], content, phase, tokens)
+    async with asyncio.TaskGroup() as tg:
+        tasks = [tg.create_task(limited(k, u)) for k, u in enumerate(usernames)]
+    metrics.add_results(t.result() for t in tasks)
+    elapsed_all = (time.perf_counter_ns() - start_all) / 1e9
     print(f"{phase} 完成，总耗时 {elapsed_all:.2f}s")
     return metrics
 
-def run_burst(tokens: Dict[str, TokenInfo], requests: int, concurrency: int) -> Metrics:
+async def run_burst(tokens: Dict[str, TokenInfo], requests: int, concurrency: int) -> Metrics:
     print(f"开始 Burst 模式: {requests} 请求, 并发={concurrency} ...")
     metrics = Metrics("burst")
-    ensure_tokens_valid(tokens)
+    await ensure_tokens_valid(tokens)
     token_list = list(tokens.items())
     if not token_list:
         print("无可用 token，跳过 Burst。")
         return metrics
-    start_all = time.time()
-    def task(i: int):
-        user, ti = random.choice(token_list)
+    # 一次性抽好每个请求使用的 token，热路径里不再逐个调用 random.choice
+    slots = random.choices(token_list, k=requests)
+    start_all = time.perf_counter_ns()
+    async def task(i: int):
+        user, ti = slots[i]
         # 单请求前检查是否快过期
         if ti.expires_at - time.time() < TOKEN_REFRESH_GRACE:
-            refreshed = login_user(user, USER_PASSWORD)
+            refreshed = await refresh_token(tokens, user)
             if refreshed:
-                tokens[user] = refreshed
                 ti = refreshed
-        return send_chat(user, ti, "说一个数字", "burst", tokens)
-    with ThreadPoolExecutor(max_workers=concurrency) as executor:
-        futures = [executor.submit(task, i) for i in range(requests)]
-        for fut in as_completed(futures):
-            metrics.results.append(fut.result())
-    total_elapsed = time.time() - start_all
+        return await send_chat(user, ti, "说一个数字", "burst", tokens)
+    # 固定 concurrency 个 worker 从共享迭代器领取序号，不为每个请求单独建 Task/抢信号量；
+    # 结果按序号写入预分配的列表，不做 append 扩容
+    indices = iter(range(requests))
+    results: List[RequestResult | None] = [None] * requests
+    async def worker():
+        for i in indices:
+            results[i] = await task(i)
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, requests)))))
+    metrics.add_results(results)
+    total_elapsed = (time.perf_counter_ns() - start_all) / 1e9
     succ = sum(1 for r in metrics.results if r.ok)
     print(f"Burst 完成: 成功 {succ}/{len(metrics.results)}, 总耗时 {total_elapsed:.2f}s, 简易TPS={succ/total_elapsed if total_elapsed>0 else 0:.2f}")
     return metrics
@@ -425,19 +504,20 @@ def print_metrics(metrics: Metrics):
     else:
         print("  错误分布: 无")
 
-def cleanup_users(usernames: List[str]):
+async def cleanup_users(usernames: List[str]):
     if not CLEANUP_USERS:
         return
     print("清理: 停用测试用户 ...")
-    for u in usernames:
+    async def deactivate(u: str):
         try:
-            httpx.post(
+            await SHARED_CLIENT.post(
                 f"{ADMIN_BASE}/users/{u}/active",
                 json={"is_active": False},
                 timeout=REQUEST_TIMEOUT,
             )
         except Exception:
             pass
+    await gather_limited(PARALLEL_ACTIVATE_WORKERS, (deactivate(u) for u in usernames))
 
 def physical_cleanup(created_usernames: List[str] | None = None, extra_usernames: List[str] | None = None, prefix_only: bool = False):
     """物理清理用户/配额/日志
@@ -450,9 +530,15 @@ def physical_cleanup(created_usernames: List[str] | None = None, extra_usernames
     logs_users_dir = base_dir.parent / 'logs' / 'users'
     targets: set[str] = set()
     if prefix_only:
-        if users_dir.exists():
-            for f in users_dir.glob(f"{BASE_USERNAME}*.toml"):
-                targets.add(f.stem)
+        # os.scandir + 前后缀判断，不为每个条目构造 Path / 编译 glob 模式
+        try:
+            with os.scandir(users_dir) as it:
+                targets.update(
+                    e.name[:-5] for e in it
+                    if e.name.startswith(BASE_USERNAME) and e.name.endswith(".toml")
+                )
+        except FileNotFoundError:
+            pass
     else:
         if created_usernames:
             targets.update(created_usernames)
@@ -461,28 +547,24 @@ def physical_cleanup(created_usernames: List[str] | None = None, extra_usernames
     if not targets:
         print("(物理清理: 无目标)")
         return
+    created_set = set(created_usernames or ())
     removed_users = removed_quotas = removed_logs = 0
     for uname in sorted(targets):
-        if not (uname.startswith(BASE_USERNAME) or (created_usernames and uname in created_usernames)):
+        if not (uname.startswith(BASE_USERNAME) or uname in created_set):
             continue
-        user_file = users_dir / f"{uname}.toml"
-        quota_file = quotas_dir / f"{uname}.json"
-        log_dir = logs_users_dir / uname
-        try:
-            if user_file.exists():
-                user_file.unlink(); removed_users += 1
-        except Exception: pass
+        # 直接 unlink，不存在时忽略 (省掉一次 exists() stat)
         try:
-            if quota_file.exists():
-                quota_file.unlink(); removed_quotas += 1
-        except Exception: pass
+            os.unlink(os.path.join(users_dir, f"{uname}.toml")); removed_users += 1
+        except OSError: pass
         try:
-            if log_dir.exists():
-                shutil.rmtree(log_dir, ignore_errors=True); removed_logs += 1
-        except Exception: pass
+            os.unlink(os.path.join(quotas_dir, f"{uname}.json")); removed_quotas += 1
+        except OSError: pass
+        log_dir = os.path.join(logs_users_dir, uname)
+        if os.path.isdir(log_dir):
+            shutil.rmtree(log_dir, ignore_errors=True); removed_logs += 1
     print(f"物理清理完成: 用户文件={removed_users}, 配额文件={removed_quotas}, 日志目录={removed_logs}")
 
-def main():
+async def run_stability() -> int:
     print_section("DeepSeek 代理稳定性/压力测试")
     print(f"代理地址: {PROXY_URL}")
     print(f"用户数量: {USER_COUNT}")
@@ -491,9 +573,9 @@ def main():
     print(f"创建用户: {CREATE_USERS}, 清理用户(API): {CLEANUP_USERS}, 前置清理: {PRE_CLEAN}, 结束物理清理: {PHYSICAL_CLEAN}")
     print(f"随机种子: {RANDOM_SEED}\n")
 
-    # 基础可达性检测
+    # 基础可达性检测 (复用共享连接池; HEAD 公开的 /metrics，不传输响应体)
     try:
-        httpx.get(f"{PROXY_URL}/auth/login", timeout=2.0)
+        await SHARED_CLIENT.head(f"{PROXY_URL}/metrics", timeout=2.0)
     except Exception:
         print("❌ 错误: 代理服务未启动! 请先运行: .\\start.ps1")
         sys.exit(1)
@@ -504,29 +586,29 @@ def main():
         physical_cleanup(prefix_only=True)
 
     # 1. 创建用户
-    usernames, created_usernames = create_users(USER_COUNT)
+    usernames, created_usernames = await create_users(USER_COUNT)
 
     # 2. 登录获取 token
-    tokens = login_users(usernames)
+    tokens = await login_users(usernames)
     if not tokens:
         print("❌ 无任何用户登录成功，退出。")
-        cleanup_users(usernames)
+        await cleanup_users(usernames)
         sys.exit(1)
 
     # 3. Round 1
-    m1 = run_round(tokens, "round1")
+    m1 = await run_round(tokens, "round1")
     print_metrics(m1)
 
     # 4. Rest
     print(f"休眠 {REST_INTERVAL}s 等待 ...")
-    time.sleep(REST_INTERVAL)
+    await asyncio.sleep(REST_INTERVAL)
 
     # 5. Round 2
-    m2 = run_round(tokens, "round2")
+    m2 = await run_round(tokens, "round2")
     print_metrics(m2)
 
     # 6. Burst
-    mb = run_burst(tokens, BURST_REQUESTS, BURST_CONCURRENCY)
+    mb = await run_burst(tokens, BURST_REQUESTS, BURST_CONCURRENCY)
     print_metrics(mb)
 
     # 汇总
@@ -569,15 +651,20 @@ def main():
         exit_code = 0
 
     # 可选清理
-    cleanup_users(usernames)
+    await cleanup_users(usernames)
     if PHYSICAL_CLEAN:
         print_section("后置物理清理")
         physical_cleanup(created_usernames=created_usernames, extra_usernames=[u for u in usernames if u.startswith(BASE_USERNAME)], prefix_only=False)
+    return exit_code
+
+async def amain() -> int:
     try:
-        SHARED_CLIENT.close()
-    except Exception:
-        pass
-    sys.exit(exit_code)
+        return await run_stability()
+    finally:
+        await SHARED_CLIENT.aclose()
+
+def main():
+    sys.exit(asyncio.run(amain()))
 
 if __name__ == "__main__":
     main()
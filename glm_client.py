@@ -1,10 +1,35 @@
 """
 基于 httpx 的智谱 AI GLM API 客户端 - 仅支持同步流式调用
 """
-import json
 import os
+import ssl
 from typing import Any, Dict, List, Optional, Iterator
+import certifi
 import httpx
+import orjson
+
+
+# 所有客户端共用一个 SSL 上下文: CA 证书只加载一次 (与 httpx 默认一样用 certifi)，TLS 会话缓存也可跨实例复用
+_SSL_CTX = ssl.create_default_context(cafile=certifi.where())
+
+SSE_DATA_PREFIX = b"data:"
+SSE_DONE = b"[DONE]"
+
+
+def _parse_sse_line(line: bytes):
+    """解析一行 SSE: 返回 delta 文本；流式结束标志返回 SSE_DONE；空行、其他字段及无法解析的帧返回 None"""
+    # SSE 格式: "data: {json}" (按规范冒号后的空格可省略)，空行及其他字段直接跳过
+    if not line.startswith(SSE_DATA_PREFIX):
+        return None
+    data = line[len(SSE_DATA_PREFIX):].strip()
+    if data == SSE_DONE:
+        return SSE_DONE
+    
+    # 成功响应的 choices 恒为单元素列表，走 try 快路径提取文本
+    try:
+        return orjson.loads(data)["choices"][0]["delta"].get("content")
+    except (orjson.JSONDecodeError, KeyError, IndexError, TypeError, AttributeError):
+        return None
 
 
 class GLMClient:
@@ -30,6 +55,7 @@ class GLMClient:
         self.client = httpx.Client(
             base_url=self.BASE_URL,
             timeout=timeout,
+            verify=_SSL_CTX,
             headers={
                 "Authorization": f"Bearer {api_key}",
                 "Content-Type": "application/json"
@@ -74,30 +100,25 @@ class GLMClient:
         with self.client.stream("POST", "/chat/completions", json=payload) as response:
             response.raise_for_status()
             
-            for line in response.iter_lines():
-                if not line.strip():
-                    continue
-                
-                # SSE 格式: "data: {json}"
-                if line.startswith("data: "):
-                    data_str = line[6:]  # 去掉 "data: " 前缀
-                    
+            # 直接在字节层面切行解析，避免 iter_lines 的逐行解码与中间字符串
+            buf = bytearray()
+            for raw in response.iter_bytes(8192):
+                buf += raw
+                start = 0
+                while (end := buf.find(b"\n", start)) != -1:
+                    content = _parse_sse_line(bytes(buf[start:end]))
+                    start = end + 1
                     # 流式结束标志
-                    if data_str.strip() == "[DONE]":
-                        break
-                    
-                    try:
-                        chunk = json.loads(data_str)
-                        
-                        # 提取流式返回的文本内容
-                        if "choices" in chunk and len(chunk["choices"]) > 0:
-                            delta = chunk["choices"][0].get("delta", {})
-                            content = delta.get("content", "")
-                            if content:
-                                yield content
-                                
-                    except json.JSONDecodeError:
-                        continue
+                    if content is SSE_DONE:
+                        return
+                    if content:
+                        yield content
+                del buf[:start]
+            
+            # 流结束时最后一行可能没有换行符，仍需解析
+            content = _parse_sse_line(bytes(buf))
+            if content and content is not SSE_DONE:
+                yield content
     
     def close(self):
         """关闭客户端"""
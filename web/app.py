@@ -4,23 +4,51 @@ DeepSeek 代理 - 管理面板（一体化 FastAPI 应用）
 启动: python app.py
 访问: http://127.0.0.1:8089
 """
-from fastapi import FastAPI
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import FileResponse, ORJSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from contextlib import asynccontextmanager
+import asyncio
+import gzip
+import hashlib
 import httpx
-import json
+import orjson
+import os
 import re
+import time
 from pathlib import Path
-from datetime import datetime
-
-app = FastAPI(title="DeepSeek Admin Panel")
 
 # ============ 配置 ============
 PROXY_URL = "http://localhost:8877"
 METRICS_URL = f"{PROXY_URL}/metrics"
+OVERVIEW_CACHE_TTL = 2.0  # 秒；多个标签页同时轮询时合并为一次抓取+解析
+OVERVIEW_MAX_WAITERS = 16  # 排队等待刷新的请求上限，超出后不再排队
+OVERVIEW_PUSH_INTERVAL = 1.0  # 秒；SSE 推送检查间隔，数据有变化才推送
+METRICS_TIMEOUT = 1.5  # 秒；代理在本机，正常响应远低于此值
+METRICS_BACKOFF = 10.0  # 秒；抓取指标连接失败后，这段时间内不再尝试
 USERS_DIR = Path(__file__).parent.parent / "deepseek_proxy" / "data" / "users"
 LOGS_DIR = Path(__file__).parent.parent / "deepseek_proxy" / "logs" / "users"
 
+# 全局复用的 HTTP 客户端 (在 lifespan 中创建/关闭)，避免每次请求重建连接池
+http_client: httpx.AsyncClient | None = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global http_client
+    # 面板每 5 秒轮询一次，而 httpx 默认空闲连接 5 秒即过期，延长保活以复用到代理的连接
+    http_client = httpx.AsyncClient(
+        timeout=METRICS_TIMEOUT,
+        limits=httpx.Limits(max_keepalive_connections=4, max_connections=8, keepalive_expiry=60),
+    )
+    try:
+        yield
+    finally:
+        await http_client.aclose()
+
+
+app = FastAPI(title="DeepSeek Admin Panel", lifespan=lifespan)
+
 # ============ 前端 HTML ============
 FRONTEND_HTML = """<!DOCTYPE html>
 <html lang="zh-cn">
@@ -169,6 +197,7 @@ FRONTEND_HTML = """<!DOCTYPE html>
   <script>
     const CONFIG = {
       apiUrl: '/api/overview',
+      streamUrl: '/api/overview/stream',
       updateInterval: 5000,
       historyLimit: 60
     };
@@ -176,27 +205,12 @@ FRONTEND_HTML = """<!DOCTYPE html>
     const state = {
       history: [],
       loginChart: null,
-  quotaChart: null // deprecated
+  quotaChart: null, // deprecated
+      cardEls: null,         // 卡片 key -> .card-value 节点
+      userTags: new Map(),   // 用户名 -> 标签节点
+      emptyTag: null
     };
 
-    // 获取数据
-    async function fetchData() {
-      try {
-        const response = await fetch(CONFIG.apiUrl);
-        if (!response.ok) throw new Error(`HTTP ${response.status}`);
-        const json = await response.json();
-        if (!json.success) throw new Error(json.error || '未知错误');
-        
-        return {
-          data: json.data,
-          timestamp: new Date()
-        };
-      } catch (error) {
-        console.error('获取数据失败:', error);
-        throw error;
-      }
-    }
-
     // 创建/更新登录图表
     function updateLoginChart(data) {
       const canvas = document.getElementById('loginChart');
@@ -220,225 +234,483 @@ FRONTEND_HTML = """<!DOCTYPE html>
     }
 
 
+    // 卡片定义: 节点只创建一次，之后每次更新只改对应 .card-value 的文本
+    const CARD_DEFS = [
+      { key: 'login_success', label: '登录成功', className: 'success' },
+      { key: 'login_failure', label: '登录失败', className: 'warning' },
+      { key: 'bruteforce_blocked', label: '暴力破解阻断', className: 'alert' },
+      { key: 'rate_limit_reject', label: '限流拒绝', className: 'warning' },
+      { key: 'chat_success', label: '聊天请求', className: 'success' },
+  // 配额相关已移除
+      { key: 'today_input_tokens', label: '今日输入Tokens', className: 'warning' },
+      { key: 'today_output_tokens', label: '今日输出Tokens', className: 'warning' },
+      { key: 'today_cache_hit_tokens', label: '缓存命中Tokens', className: 'success' },
+      { key: 'today_cache_miss_tokens', label: '缓存未命中Tokens', className: 'warning' },
+      { key: 'total_cost', label: '今日预估费用(¥)', className: 'alert' },
+      { key: 'cost_detail', label: '费用明细(¥)', className: 'warning', extra: '命中 / 未命中 / 输出' }
+    ];
+
+    function buildCards() {
+      const container = document.getElementById('cards');
+      state.cardEls = {};
+      for (const def of CARD_DEFS) {
+        const card = document.createElement('div');
+        card.className = `card ${def.className}`;
+        card.innerHTML = `<div class="card-label">${def.label}${def.extra ? ' <span style="color:#999;font-weight:normal">'+def.extra+'</span>' : ''}</div><div class="card-value"></div>`;
+        container.appendChild(card);
+        state.cardEls[def.key] = card.querySelector('.card-value');
+      }
+    }
+
     // 更新卡片
     function updateCards(data) {
-      const container = document.getElementById('cards');
+      if (!state.cardEls) buildCards();
+      const metrics = data.data.metrics || {};
       // 防御性：如果后端还没返回 cost_estimate，构造默认对象
-      const ce = (data.data.metrics && data.data.metrics.cost_estimate) ? data.data.metrics.cost_estimate : {hit_cost:0, miss_cost:0, output_cost:0, total_cost:0};
-      
-      const cards = [
-        { label: '登录成功', value: data.data.metrics.login_success, className: 'success' },
-        { label: '登录失败', value: data.data.metrics.login_failure, className: 'warning' },
-        { label: '暴力破解阻断', value: data.data.metrics.bruteforce_blocked, className: 'alert' },
-        { label: '限流拒绝', value: data.data.metrics.rate_limit_reject, className: 'warning' },
-        { label: '聊天请求', value: data.data.metrics.chat_success, className: 'success' },
-  // 配额相关已移除
-        { label: '今日输入Tokens', value: data.data.metrics.today_input_tokens, className: 'warning' },
-        { label: '今日输出Tokens', value: data.data.metrics.today_output_tokens, className: 'warning' },
-        { label: '缓存命中Tokens', value: data.data.metrics.today_cache_hit_tokens, className: 'success' },
-        { label: '缓存未命中Tokens', value: data.data.metrics.today_cache_miss_tokens, className: 'warning' },
-        { label: '今日预估费用(¥)', value: ce.total_cost.toFixed(2), className: 'alert' },
-        { label: '费用明细(¥)', value: `${ce.hit_cost.toFixed(2)} / ${ce.miss_cost.toFixed(2)} / ${ce.output_cost.toFixed(2)}`, className: 'warning', extra: '命中 / 未命中 / 输出' }
-      ];
-
-      container.innerHTML = cards.map(card => `
-        <div class="card ${card.className}">
-          <div class="card-label">${card.label}${card.extra ? ' <span style="color:#999;font-weight:normal">'+card.extra+'</span>' : ''}</div>
-          <div class="card-value">${typeof card.value === 'number' ? Math.round(card.value) : card.value}</div>
-        </div>
-      `).join('');
+      const ce = metrics.cost_estimate || {hit_cost:0, miss_cost:0, output_cost:0, total_cost:0};
+      const values = {
+        ...metrics,
+        total_cost: ce.total_cost.toFixed(2),
+        cost_detail: `${ce.hit_cost.toFixed(2)} / ${ce.miss_cost.toFixed(2)} / ${ce.output_cost.toFixed(2)}`
+      };
+      for (const def of CARD_DEFS) {
+        const value = values[def.key];
+        const text = String(typeof value === 'number' ? Math.round(value) : value);
+        const el = state.cardEls[def.key];
+        if (el.textContent !== text) el.textContent = text;
+      }
     }
 
-    // 更新活跃用户
+    // 更新活跃用户: 只增删有变化的标签
     function updateActiveUsers(data) {
       const container = document.getElementById('activeUsers');
-      const users = data.data.active_users || [];
-      container.innerHTML = users.length === 0 
-        ? '<span class="tag">暂无活跃用户</span>'
-        : users.map(user => `<span class="tag active">${user}</span>`).join('');
+      const users = new Set(data.data.active_users || []);
+      for (const [user, node] of state.userTags) {
+        if (!users.has(user)) {
+          node.remove();
+          state.userTags.delete(user);
+        }
+      }
+      for (const user of users) {
+        if (state.userTags.has(user)) continue;
+        const tag = document.createElement('span');
+        tag.className = 'tag active';
+        tag.textContent = user;
+        container.appendChild(tag);
+        state.userTags.set(user, tag);
+      }
+      if (!state.emptyTag) {
+        state.emptyTag = document.createElement('span');
+        state.emptyTag.className = 'tag';
+        state.emptyTag.textContent = '暂无活跃用户';
+        container.prepend(state.emptyTag);
+      }
+      state.emptyTag.style.display = users.size === 0 ? '' : 'none';
     }
 
-    // 主更新循环
+    // 渲染一次概览响应 ({success, data, error})
+    function render(json) {
+      if (!json.success) throw new Error(json.error || '未知错误');
+      const data = { data: json.data, timestamp: new Date() };
+      document.getElementById('error').style.display = 'none';
+      updateCards(data);
+      updateLoginChart(data);
+      updateActiveUsers(data);
+    }
+
+    function showError(message) {
+      const errorEl = document.getElementById('error');
+      errorEl.textContent = `❌ 数据加载失败: ${message}`;
+      errorEl.style.display = 'block';
+    }
+
+    // 轮询模式 (浏览器不支持 EventSource 时使用)
     async function update() {
       try {
-        document.getElementById('error').style.display = 'none';
-        
-        const data = await fetchData();
-        
-        updateCards(data);
-        updateLoginChart(data);
-        updateActiveUsers(data);
-        
+        const response = await fetch(CONFIG.apiUrl);
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        render(await response.json());
       } catch (error) {
-        const errorEl = document.getElementById('error');
-        errorEl.textContent = `❌ 数据加载失败: ${error.message}`;
-        errorEl.style.display = 'block';
+        console.error('获取数据失败:', error);
+        showError(error.message);
       }
     }
 
-    // 初始化
+    // 初始化: 优先用 SSE 由后端在数据变化时推送，断线由 EventSource 自动重连
     window.addEventListener('DOMContentLoaded', () => {
-      update();
-      setInterval(update, CONFIG.updateInterval);
+      if (!window.EventSource) {
+        update();
+        setInterval(update, CONFIG.updateInterval);
+        return;
+      }
+      const source = new EventSource(CONFIG.streamUrl);
+      source.onmessage = (event) => {
+        try {
+          render(JSON.parse(event.data));
+        } catch (error) {
+          showError(error.message);
+        }
+      };
+      source.onerror = () => showError('推送连接中断，正在重连...');
     });
   </script>
 </body>
 </html>
 """
+# 页面内容固定，启动时编码一次，并预先压缩一份 gzip；ETag 供浏览器条件请求，内容未变时直接 304
+FRONTEND_BYTES = FRONTEND_HTML.encode("utf-8")
+FRONTEND_GZIP = gzip.compress(FRONTEND_BYTES, 9, mtime=0)
+FRONTEND_ETAG = f'"{hashlib.sha256(FRONTEND_BYTES).hexdigest()[:16]}"'
+FRONTEND_GZIP_ETAG = FRONTEND_ETAG[:-1] + '-gz"'  # 不同编码的表示使用不同的 ETag
+FRONTEND_HEADERS = {"ETag": FRONTEND_ETAG, "Cache-Control": "public, max-age=300", "Vary": "Accept-Encoding"}
+FRONTEND_GZIP_HEADERS = {**FRONTEND_HEADERS, "ETag": FRONTEND_GZIP_ETAG, "Content-Encoding": "gzip"}
+# 响应对象本身也只构造一次，每次请求直接返回 (Response 发送时不修改自身状态)
+FRONTEND_RESPONSE = Response(FRONTEND_BYTES, media_type="text/html; charset=utf-8", headers=FRONTEND_HEADERS)
+FRONTEND_GZIP_RESPONSE = Response(FRONTEND_GZIP, media_type="text/html; charset=utf-8", headers=FRONTEND_GZIP_HEADERS)
+FRONTEND_NOT_MODIFIED = Response(status_code=304, headers=FRONTEND_HEADERS)
+FRONTEND_GZIP_NOT_MODIFIED = Response(status_code=304, headers={**FRONTEND_HEADERS, "ETag": FRONTEND_GZIP_ETAG})
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Accept-Encoding 是否接受 gzip: q=0 表示明确拒绝；未列出 gzip 时看 * 的 q 值"""
+    accepted = False
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if coding not in ("gzip", "*"):
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding == "gzip":
+            return q > 0
+        accepted = q > 0
+    return accepted
 
 # ============ 后端逻辑 ============
-def parse_prometheus_metrics(text: str) -> dict:
-    """解析 Prometheus 格式指标"""
-    result = {}
-    for line in text.split('\n'):
-        if line.startswith('#') or not line.strip():
-            continue
-        
-        # 有标签的指标: metric_name{label="value"} value
-        match = re.match(r'(\w+)\{([^}]+)\}\s+([\d.eE+-]+)', line)
-        if match:
-            name, labels_str, value = match.groups()
-            labels = {}
-            for pair in labels_str.split(','):
-                k, v = pair.split('=', 1)
-                labels[k.strip()] = v.strip('"')
-            
-            if name not in result:
-                result[name] = {}
-            key = tuple(sorted(labels.items()))
-            result[name][key] = float(value)
+# 一条样本一行: 指标名 [{标签}] 值 [时间戳]；注释行 (#) 与空行匹配不上，直接被跳过
+METRIC_LINE_PATTERN = r'^({names})(?=[{{ \t])(?:\{{(.*)\}})?[ \t]+(\S+)'
+
+# 面板字段 -> (指标名, 标签名, 标签值)；无标签指标的标签名/值为 None
+DASHBOARD_FIELDS = (
+    ("login_success", "login_attempts_total", "result", "success"),
+    ("login_failure", "login_attempts_total", "result", "failure"),
+    ("bruteforce_blocked", "login_bruteforce_blocked_total", None, None),
+    ("rate_limit_reject", "rate_limit_rejections_total", None, None),
+    ("chat_success", "chat_requests_total", "status", "success"),
+    ("quota_exceeded", "quota_checks_total", "status", "exceeded"),
+    ("today_input_tokens", "today_input_tokens", None, None),
+    ("today_output_tokens", "today_output_tokens", None, None),
+    ("today_cache_hit_tokens", "today_prompt_cache_hit_tokens", None, None),
+    ("today_cache_miss_tokens", "today_prompt_cache_miss_tokens", None, None),
+)
+
+# (指标名, 标签对) -> 面板字段；无标签指标的标签对为 None
+DASHBOARD_SERIES = {
+    (name, None if label_key is None else (label_key, label_value)): field
+    for field, name, label_key, label_value in DASHBOARD_FIELDS
+}
+
+# 只匹配面板用到的指标名 (名字后必须紧跟 { 或空白，避免前缀误匹配)，其余序列 (直方图桶等) 不做标签/数值解析
+DASHBOARD_LINE_RE = re.compile(
+    METRIC_LINE_PATTERN.format(names='|'.join(re.escape(name) for name in sorted({name for name, _ in DASHBOARD_SERIES}))),
+    re.M,
+)
+
+
+# 标签对 key="value"，值内允许转义 (\" \\ \n)，逗号/等号在引号内不会被误切
+LABEL_RE = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)\s*=\s*"((?:[^"\\]|\\.)*)"')
+LABEL_ESCAPE_RE = re.compile(r'\\(.)')
+
+
+def _unescape_label(value: str) -> str:
+    if '\\' not in value:
+        return value
+    return LABEL_ESCAPE_RE.sub(lambda m: '\n' if m.group(1) == 'n' else m.group(1), value)
+
+
+def scan_dashboard_values(text: str) -> dict:
+    """单次扫描 Prometheus 指标文本，直接取出面板字段的值 (不构建中间的指标字典)
+    
+    同一字段匹配到多条序列时取第一条；没出现的字段为 0.0
+    """
+    found = {}
+    for match in DASHBOARD_LINE_RE.finditer(text):
+        name, labels_str, raw = match.groups()
+        if labels_str is None:
+            keys = ((name, None),)
         else:
-            # 无标签的指标: metric_name value
-            match = re.match(r'(\w+)\s+([\d.eE+-]+)', line)
-            if match:
-                name, value = match.groups()
-                result[name] = float(value)
+            keys = [(name, (k, _unescape_label(v))) for k, v in LABEL_RE.findall(labels_str)]
+        for key in keys:
+            field = DASHBOARD_SERIES.get(key)
+            if field is None or field in found:
+                continue
+            try:
+                found[field] = float(raw)
+            except ValueError:
+                break
     
-    return result
+    return {field: found.get(field, 0.0) for field, _, _, _ in DASHBOARD_FIELDS}
+
+
+
+
+def tail_lines(path: Path, n: int = 100, block: int = 8192) -> list:
+    """从文件末尾按块向前读取，直到凑够 n 行或读到文件头，返回最后 n 行 (bytes)"""
+    with open(path, 'rb') as f:
+        pos = f.seek(0, 2)
+        chunks = []
+        newlines = 0
+        # 需要 n+1 个换行: 最前面一段可能是被截断的半行
+        while pos > 0 and newlines <= n:
+            size = min(block, pos)
+            pos -= size
+            f.seek(pos)
+            chunk = f.read(size)
+            chunks.append(chunk)
+            newlines += chunk.count(b"\n")
+    lines = b"".join(reversed(chunks)).splitlines()
+    if pos > 0 and lines:
+        lines = lines[1:]  # 第一行可能被截断
+    return lines[-n:]
+
+
+# 日志行里的数值时间戳字段；只需判断最近时间，不必整行 JSON 解码
+LOG_TIMESTAMP_RE = re.compile(rb'"(?:timestamp|time)"\s*:\s*(-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)')
+
+
+def active_since(lines: list, cutoff: float) -> bool:
+    """日志行中是否有不早于 cutoff 的时间戳"""
+    stamps = LOG_TIMESTAMP_RE.findall(b"\n".join(lines))
+    if stamps:
+        return max(map(float, stamps)) >= cutoff
+    # 正则没匹配到 (字段格式不同)，退回逐行 JSON 解析
+    for line in reversed(lines):
+        try:
+            obj = orjson.loads(line)
+            ts = obj.get('timestamp') or obj.get('time')
+            if isinstance(ts, (int, float)) and ts >= cutoff:
+                return True
+        except Exception:
+            continue
+    return False
 
 
-def extract_metric_value(metrics: dict, name: str, label_key: str = None, label_value: str = None) -> float:
-    """从解析后的指标中提取值"""
-    if name not in metrics:
-        return 0.0
-    
-    if label_key is None:
-        return metrics[name] if isinstance(metrics[name], (int, float)) else 0.0
-    
-    metric_dict = metrics[name]
-    if not isinstance(metric_dict, dict):
-        return 0.0
-    
-    for key, val in metric_dict.items():
-        if isinstance(key, tuple):
-            for k, v in key:
-                if k == label_key and v == label_value:
-                    return val
-    
-    return 0.0
+# 活跃用户按分钟粒度缓存: 同一分钟内的轮询直接复用上次扫描结果
+_active_users_cache = {"key": None, "users": []}
 
 
+def get_active_users(minutes: int = 60) -> list:
+    """获取最近N分钟活跃的用户 (结果按分钟缓存)"""
+    key = (minutes, int(time.time() // 60))
+    if _active_users_cache["key"] != key:
+        _active_users_cache["users"] = scan_active_users(minutes)
+        _active_users_cache["key"] = key
+    return _active_users_cache["users"]
 
 
-def get_active_users(minutes: int = 60) -> list:
-    """获取最近N分钟活跃的用户"""
-    cutoff = datetime.utcnow().timestamp() - minutes * 60
+def scan_active_users(minutes: int) -> list:
+    """扫描用户日志目录，找出最近N分钟活跃的用户"""
+    cutoff = time.time() - minutes * 60
     active = []
     
     if not LOGS_DIR.exists():
         return active
     
-    for user_dir in LOGS_DIR.iterdir():
-        if not user_dir.is_dir():
-            continue
-        
-        log_files = sorted(user_dir.glob('*.log'), reverse=True)
-        if not log_files:
-            continue
-        
-        try:
-            lines = log_files[0].read_text().splitlines()[-100:]
-            for line in reversed(lines):
-                try:
-                    obj = json.loads(line)
-                    ts = obj.get('timestamp') or obj.get('time')
-                    if isinstance(ts, (int, float)) and ts >= cutoff:
-                        active.append(user_dir.name)
-                        break
-                except Exception:
-                    continue
-        except Exception:
-            pass
+    with os.scandir(LOGS_DIR) as user_dirs:
+        for user_dir in user_dirs:
+            if not user_dir.is_dir():
+                continue
+            
+            # 取修改时间最新的日志；cutoff 之后没写过日志的用户必然不活跃，不必读文件
+            newest, newest_mtime = None, cutoff
+            try:
+                with os.scandir(user_dir.path) as entries:
+                    for entry in entries:
+                        if entry.name.endswith('.log') and entry.is_file():
+                            mtime = entry.stat().st_mtime
+                            if mtime >= newest_mtime:
+                                newest, newest_mtime = entry.path, mtime
+                if newest and active_since(tail_lines(newest, 100), cutoff):
+                    active.append(user_dir.name)
+            except Exception:
+                pass
     
     return active
 
 
 # ============ 路由 ============
 @app.get("/")
-async def root():
+async def root(request: Request):
     """返回前端 HTML"""
-    from fastapi.responses import HTMLResponse
-    return HTMLResponse(FRONTEND_HTML)
+    if accepts_gzip(request.headers.get("accept-encoding", "")):
+        etag, not_modified, response = FRONTEND_GZIP_ETAG, FRONTEND_GZIP_NOT_MODIFIED, FRONTEND_GZIP_RESPONSE
+    else:
+        etag, not_modified, response = FRONTEND_ETAG, FRONTEND_NOT_MODIFIED, FRONTEND_RESPONSE
+    if request.headers.get("if-none-match") == etag:
+        return not_modified
+    return response
+
+
+# 概览数据缓存: 存序列化好的成功响应体 (bytes)，命中时不再重复序列化；
+# 锁保证并发请求只有一个去抓取 (single-flight)
+_overview_cache = {"ts": 0.0, "body": None, "waiting": 0}
+_overview_lock = asyncio.Lock()
+
+
+class OverviewBusy(Exception):
+    """等待刷新的请求过多且没有可用的旧数据"""
+
+
+class ProxyUnavailable(Exception):
+    """代理最近连接失败，退避期内不再尝试抓取指标"""
+
+
+# 熔断状态: 连接失败后到 until (monotonic) 之前直接失败，不必每次都等满超时
+_metrics_breaker = {"until": 0.0}
+
+
+async def fetch_metrics_text() -> str:
+    """拉取代理的 Prometheus 指标文本，失败状态返回空串"""
+    if time.monotonic() < _metrics_breaker["until"]:
+        raise ProxyUnavailable(f"代理 {PROXY_URL} 不可用，稍后重试")
+    try:
+        resp = await http_client.get(METRICS_URL)
+    except httpx.TransportError:
+        _metrics_breaker["until"] = time.monotonic() + METRICS_BACKOFF
+        raise
+    _metrics_breaker["until"] = 0.0
+    return resp.text if resp.status_code == 200 else ""
+
+
+# 最近一次的指标文本及其汇总结果；空闲时代理指标文本不变，直接复用，跳过解析
+_metrics_memo = {"text": None, "summary": None}
+
+
+def summarize_metrics(metrics_text: str) -> dict:
+    """从指标文本提取面板所需的计数与费用估算 (文本未变时复用上次结果)"""
+    if metrics_text == _metrics_memo["text"]:
+        return _metrics_memo["summary"]
+
+    values = scan_dashboard_values(metrics_text)
+
+    hit_tokens = values["today_cache_hit_tokens"]
+    miss_tokens = values["today_cache_miss_tokens"]
+    if hit_tokens == 0 and miss_tokens == 0 and values["today_input_tokens"] > 0:
+        miss_tokens = values["today_input_tokens"]
+
+    costs = {
+        "hit_cost": hit_tokens / 1_000_000 * 0.2,
+        "miss_cost": miss_tokens / 1_000_000 * 2.0,
+        "output_cost": values["today_output_tokens"] / 1_000_000 * 3.0,
+    }
+    costs["total_cost"] = sum(costs.values())
+
+    summary = {field: int(value) for field, value in values.items()}
+    summary["cost_estimate"] = {key: round(cost, 6) for key, cost in costs.items()}
+    _metrics_memo["text"], _metrics_memo["summary"] = metrics_text, summary
+    return summary
+
+
+async def build_overview() -> dict:
+    """抓取并汇总概览数据"""
+    # 指标抓取与日志扫描并行；日志扫描是阻塞文件 IO，放到线程里避免卡住事件循环
+    metrics_text, active_users = await asyncio.gather(
+        fetch_metrics_text(),
+        asyncio.to_thread(get_active_users, 60),
+    )
+    return {
+        "metrics": summarize_metrics(metrics_text),
+        "active_users": active_users,
+    }
+
+
+async def cached_overview() -> bytes:
+    """带 TTL 缓存的概览响应体 ({"success": true, "data": ...} 的 JSON)
+    
+    排队等待刷新的请求超过 OVERVIEW_MAX_WAITERS 时不再排队: 有旧数据就直接返回旧数据，否则抛 OverviewBusy
+    """
+    if time.monotonic() - _overview_cache["ts"] >= OVERVIEW_CACHE_TTL:
+        if _overview_cache["waiting"] >= OVERVIEW_MAX_WAITERS:
+            if _overview_cache["body"] is not None:
+                return _overview_cache["body"]
+            raise OverviewBusy()
+        _overview_cache["waiting"] += 1
+        try:
+            async with _overview_lock:
+                # 等锁期间可能已被其他请求刷新
+                if time.monotonic() - _overview_cache["ts"] >= OVERVIEW_CACHE_TTL:
+                    _overview_cache["body"] = orjson.dumps({"success": True, "data": await build_overview()})
+                    _overview_cache["ts"] = time.monotonic()
+        finally:
+            _overview_cache["waiting"] -= 1
+    return _overview_cache["body"]
+
+
+# SSE 推送状态: 所有订阅者共用一个后台任务；body 为最近一次推送的 JSON，
+# 变化时替换 event 并 set，唤醒全部订阅者。没有订阅者时后台任务自行退出。
+_stream_state = {"body": None, "event": asyncio.Event(), "subscribers": 0, "task": None}
+
+
+async def overview_broadcaster():
+    """定期计算概览，内容变化时通知订阅者"""
+    while _stream_state["subscribers"]:
+        try:
+            body = await cached_overview()
+        except Exception as e:
+            body = orjson.dumps({"success": False, "error": str(e)})
+        if body != _stream_state["body"]:
+            _stream_state["body"] = body
+            event, _stream_state["event"] = _stream_state["event"], asyncio.Event()
+            event.set()
+        await asyncio.sleep(OVERVIEW_PUSH_INTERVAL)
+    # 停止推送后旧快照不再更新，清掉，之后的订阅者等新任务推送第一份数据
+    _stream_state["task"] = None
+    _stream_state["body"] = None
+
+
+async def overview_events():
+    """单个订阅者的 SSE 事件流"""
+    _stream_state["subscribers"] += 1
+    if _stream_state["task"] is None:
+        _stream_state["task"] = asyncio.create_task(overview_broadcaster())
+    sent = None
+    try:
+        while True:
+            body = _stream_state["body"]
+            if body is not None and body is not sent:
+                sent = body
+                yield b"data: " + body + b"\n\n"
+                continue
+            await _stream_state["event"].wait()
+    finally:
+        _stream_state["subscribers"] -= 1
 
 
 @app.get("/api/overview")
 async def get_overview():
   """获取完整概览数据"""
   try:
-    async with httpx.AsyncClient(timeout=5.0) as client:
-      resp = await client.get(METRICS_URL)
-      metrics_text = resp.text if resp.status_code == 200 else ""
-
-    metrics = parse_prometheus_metrics(metrics_text)
-    active_users = get_active_users(60)
-
-    login_success = extract_metric_value(metrics, 'login_attempts_total', 'result', 'success')
-    login_failure = extract_metric_value(metrics, 'login_attempts_total', 'result', 'failure')
-    bruteforce_blocked = extract_metric_value(metrics, 'login_bruteforce_blocked_total')
-    rate_limit_reject = extract_metric_value(metrics, 'rate_limit_rejections_total')
-    chat_success = extract_metric_value(metrics, 'chat_requests_total', 'status', 'success')
-    quota_exceeded = extract_metric_value(metrics, 'quota_checks_total', 'status', 'exceeded')
-    today_input_tokens = extract_metric_value(metrics, 'today_input_tokens')
-    today_output_tokens = extract_metric_value(metrics, 'today_output_tokens')
-    today_cache_hit_tokens = extract_metric_value(metrics, 'today_prompt_cache_hit_tokens')
-    today_cache_miss_tokens = extract_metric_value(metrics, 'today_prompt_cache_miss_tokens')
-
-    hit_tokens = today_cache_hit_tokens
-    miss_tokens = today_cache_miss_tokens
-    if hit_tokens == 0 and miss_tokens == 0 and today_input_tokens > 0:
-      miss_tokens = today_input_tokens
-
-    hit_cost = hit_tokens / 1_000_000 * 0.2
-    miss_cost = miss_tokens / 1_000_000 * 2.0
-    output_cost = today_output_tokens / 1_000_000 * 3.0
-    total_cost = hit_cost + miss_cost + output_cost
-
-    return JSONResponse({
-      "success": True,
-      "data": {
-        "metrics": {
-          "login_success": int(login_success),
-          "login_failure": int(login_failure),
-          "bruteforce_blocked": int(bruteforce_blocked),
-          "rate_limit_reject": int(rate_limit_reject),
-          "chat_success": int(chat_success),
-          "quota_exceeded": int(quota_exceeded),
-          "today_input_tokens": int(today_input_tokens),
-          "today_output_tokens": int(today_output_tokens),
-          "today_cache_hit_tokens": int(today_cache_hit_tokens),
-          "today_cache_miss_tokens": int(today_cache_miss_tokens),
-          "cost_estimate": {
-            "hit_cost": round(hit_cost, 6),
-            "miss_cost": round(miss_cost, 6),
-            "output_cost": round(output_cost, 6),
-            "total_cost": round(total_cost, 6)
-          }
-        },
-        "active_users": active_users,
-      }
-    })
+    return Response(await cached_overview(), media_type="application/json")
+  except OverviewBusy:
+    return ORJSONResponse({"success": False, "error": "busy"}, status_code=503)
   except Exception as e:
-    return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+    return ORJSONResponse({"success": False, "error": str(e)}, status_code=500)
+
+
+@app.get("/api/overview/stream")
+async def stream_overview():
+  """以 SSE 推送概览数据，仅在内容变化时发送"""
+  return StreamingResponse(
+    overview_events(),
+    media_type="text/event-stream",
+    headers={"Cache-Control": "no-cache"},
+  )
 
 
 if __name__ == "__main__":